@@ -0,0 +1,212 @@
+import glob
+import hashlib
+import json
+import os
+import secrets
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import db
+from db import get_connection, ROLLUP_PERIODS
+from cache import cached_frame
+from rollups import load_rollups, load_category_totals
+
+# --- Columnar Store ---
+# Each user's transactions are mirrored into one Parquet file per year (id, date, type, category,
+# amount) for the per-transaction Insights numbers the rollups can't answer (e.g. average amounts),
+# computed with Arrow kernels over the columns they need instead of a row-wise DataFrame of the whole
+# history. Triggers bump a per-(user, year) version on every write (db.analytics_versions), so a
+# refresh re-exports only the years that changed since the last one, whichever process wrote them.
+# Period and category totals are read from the rollups, like the Tax Report CSV export.
+ANALYTICS_DIR = None  # default: "<database file>.analytics" next to the database
+EXPORT_BATCH_SIZE = 50000
+SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('date', pa.date32()),
+    ('type', pa.string()),
+    ('category', pa.string()),
+    ('amount', pa.float64()),
+])
+# type and category are read back dictionary-encoded, which makes filters and group-bys on them cheap
+_DICTIONARY_COLUMNS = ['type', 'category']
+_READ_SCHEMA = pa.schema([pa.field(f.name, pa.dictionary(pa.int32(), pa.string())) if f.name in _DICTIONARY_COLUMNS else f
+                          for f in SCHEMA])
+_READ_FORMAT = ds.ParquetFileFormat(read_options=ds.ParquetReadOptions(dictionary_columns=_DICTIONARY_COLUMNS))
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+def _user_lock(username):
+    with _locks_lock:
+        return _locks.setdefault(username, threading.Lock())
+
+def store_dir():
+    return ANALYTICS_DIR or f"{db.DB_PATH}.analytics"
+
+def _user_dir(username):
+    return os.path.join(store_dir(), hashlib.sha1(username.encode('utf-8')).hexdigest()[:20])
+
+def _store_id(conn):
+    # Random id of this database, so a store left over from a recreated database is not reused
+    conn.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('analytics_store_id', ?)", (secrets.token_hex(8),))
+    return conn.execute("SELECT value FROM settings WHERE key = 'analytics_store_id'").fetchone()[0]
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_atomic(path, write):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def _export_year(username, year, directory):
+    # Writes one year partition from SQLite in batches (or removes it if the year has no rows)
+    path = os.path.join(directory, f"{year}.parquet")
+    with get_connection() as conn:
+        cursor = conn.execute(f'''SELECT id, date, type, category, amount FROM transactions
+                                  WHERE username = ? AND date >= ? AND date < ? AND {ROLLUP_PERIODS['year'].format(d='date')} = ?
+                                  ORDER BY date, id''', (username, f"{year}-01-01", f"{int(year) + 1}-01-01", year))
+        try:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                if os.path.exists(path):
+                    os.remove(path)
+                return
+            def write(tmp):
+                batch = rows
+                with pq.ParquetWriter(tmp, SCHEMA) as writer:
+                    while batch:
+                        ids, dates, types, categories, amounts = zip(*batch)
+                        writer.write_table(pa.table([
+                            pa.array(ids, pa.int64()),
+                            pa.array(dates, pa.string()).cast(pa.date32()),
+                            pa.array(types, pa.string()),
+                            pa.array(categories, pa.string()),
+                            pa.array(amounts, pa.float64()),
+                        ], schema=SCHEMA))
+                        batch = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            _write_atomic(path, write)
+        finally:
+            cursor.close()
+
+def refresh(username):
+    # Brings the user's store up to date with SQLite; returns the years that were re-exported
+    with _user_lock(username):
+        with get_connection() as conn:
+            store_id = _store_id(conn)
+            versions = dict(conn.execute('SELECT year, version FROM analytics_versions WHERE username = ?', (username,)).fetchall())
+        directory = _user_dir(username)
+        manifest = _read_manifest(directory)
+        reset = manifest.get('store_id') != store_id
+        if reset:
+            manifest = {'store_id': store_id, 'versions': {}}
+            for path in glob.glob(os.path.join(directory, '*.parquet')):
+                os.remove(path)
+        # Years without a valid date ('') are not part of the store
+        current = {year: version for year, version in versions.items() if year.isdigit()}
+        if not reset and manifest['versions'] == current:
+            return []
+        stale = sorted(year for year in current if manifest['versions'].get(year) != current[year])
+        os.makedirs(directory, exist_ok=True)
+        for year in stale:
+            _export_year(username, year, directory)
+        # Versions read before exporting: a write that lands meanwhile leaves the year stale for the next refresh
+        manifest['versions'] = current
+        def write(tmp):
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+        _write_atomic(os.path.join(directory, 'manifest.json'), write)
+        return stale
+
+def scan(username, columns=None, filter=None, refresh_first=True):
+    # Arrow table of the user's mirrored transactions (only the requested columns / matching rows)
+    if refresh_first:
+        refresh(username)
+    files = sorted(glob.glob(os.path.join(_user_dir(username), '*.parquet')))
+    table = ds.dataset(files, schema=_READ_SCHEMA, format=_READ_FORMAT).to_table(columns=columns, filter=filter)
+    return table.unify_dictionaries()
+
+# --- Queries ---
+# Results are small pandas frames cached like the rollup queries.
+def _cached(username, name, loader):
+    return cached_frame(username, ('analytics',) + name, loader)
+
+def period_totals(username, granularity, type=None, by_category=True, year=None):
+    # Same shape as rollups.load_rollups: period, type, [category,] total, count ordered by period.
+    # Transactions without a valid date are left out; with year, weeks count for the year they start in.
+    if granularity not in ROLLUP_PERIODS:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    return _cached(username, ('period_totals', granularity, type, by_category, year),
+                   lambda: _period_totals(username, granularity, type, by_category, year))
+
+def _period_totals(username, granularity, type, by_category, year):
+    keys = ['type', 'category'] if by_category else ['type']
+    frame = load_rollups(username, granularity, type, by_category)
+    periods = frame['period'].astype(str)
+    frame = frame[periods.str.startswith(str(year)) if year else periods != '']
+    return frame.sort_values(['period'] + keys, ignore_index=True)
+
+def category_totals(username, type=None, year=None):
+    # type, category, total, count per category over all history or one year
+    return _cached(username, ('category_totals', type, year),
+                   lambda: _category_totals(username, type, year))
+
+def _category_totals(username, type, year):
+    if year is None:
+        frame = load_category_totals(username, type)
+    else:
+        frame = load_rollups(username, 'year', type)
+        frame = frame[frame['period'] == str(year)].drop(columns='period')
+    return frame.sort_values(['type', 'category'], ignore_index=True)
+
+def top_categories(username, n=3, type='expense', year=None):
+    # category -> total of the n largest categories
+    totals = category_totals(username, type, year)
+    return totals.groupby('category')['total'].sum().nlargest(n)
+
+def available_years(username):
+    # Years with transactions, newest first
+    return sorted(period_totals(username, 'year', by_category=False)['period'].unique(), reverse=True)
+
+def savings_summary(username):
+    # Per month: income, expense, savings (income - expense) and savings rate (savings / income, 0 without income)
+    return _cached(username, ('savings_summary',), lambda: _savings_summary(username))
+
+def _savings_summary(username):
+    months = period_totals(username, 'month', by_category=False)
+    frame = months.pivot_table(index='period', columns='type', values='total', aggfunc='sum', fill_value=0)
+    frame = frame.reindex(columns=['income', 'expense'], fill_value=0).rename_axis(columns=None)
+    frame['savings'] = frame['income'] - frame['expense']
+    frame['savings_rate'] = (frame['savings'] / frame['income'].where(frame['income'] != 0)).fillna(0)
+    return frame.rename_axis('month').reset_index()
+
+def spending_recommendations(username, months=3, ratio=1.3):
+    # Expense categories whose average transaction over the last `months` months (up to the latest expense)
+    # exceeds their all-time average by more than `ratio`: category, average, recent_average, overspend
+    return _cached(username, ('spending_recommendations', months, ratio),
+                   lambda: _spending_recommendations(username, months, ratio))
+
+def _spending_recommendations(username, months, ratio):
+    columns = ['category', 'average', 'recent_average', 'overspend']
+    expenses = scan(username, ['date', 'category', 'amount'], pc.field('type') == 'expense')
+    if expenses.num_rows == 0:
+        return pd.DataFrame(columns=columns)
+    cutoff = (pd.Timestamp(pc.max(expenses['date']).as_py()) - pd.DateOffset(months=months)).date()
+    recent = expenses.filter(pc.greater_equal(expenses['date'], pa.scalar(cutoff, pa.date32())))
+    average = expenses.group_by('category').aggregate([('amount', 'mean')]).to_pandas().set_index('category')['amount_mean']
+    recent_average = recent.group_by('category').aggregate([('amount', 'mean')]).to_pandas().set_index('category')['amount_mean']
+    result = pd.DataFrame({'average': average.reindex(recent_average.index), 'recent_average': recent_average})
+    result = result[(result['average'] > 0) & (result['recent_average'] > result['average'] * ratio)]
+    result['overspend'] = result['recent_average'] - result['average']
+    return result.rename_axis('category').reset_index()[columns]
@@ -0,0 +1,76 @@
+import math
+import pandas as pd
+from db import get_connection
+from cache import cached_frame
+
+# --- Expense Anomalies ---
+# An expense is anomalous when it is above its category's mean + k*std (sample std, as pandas .std()).
+# Batch detection uses one grouped transform; single expenses are checked in O(1) against the
+# expense_stats table, which triggers keep up to date on every insert/delete (Welford's algorithm).
+ANOMALY_STD_MULTIPLIER = 2
+MIN_HISTORY = 5  # fewer expenses than this in a category are never flagged on save
+ROLLING_WINDOW = '90D'
+
+def category_thresholds(df, k=ANOMALY_STD_MULTIPLIER):
+    # Per-row threshold of an expense frame (date/category/amount columns)
+    grouped = df.groupby('category', observed=True)['amount']
+    return grouped.transform('mean') + k * grouped.transform('std')
+
+def find_anomalies(df, k=ANOMALY_STD_MULTIPLIER):
+    # Expenses above their category's all-time mean + k*std, with the threshold they exceeded
+    if df.empty:
+        return df.assign(threshold=pd.Series(dtype='float64'))
+    thresholds = category_thresholds(df, k)
+    mask = df['amount'] > thresholds
+    return df[mask].assign(threshold=thresholds[mask])
+
+def rolling_thresholds(df, window=ROLLING_WINDOW, k=ANOMALY_STD_MULTIPLIER, min_periods=MIN_HISTORY):
+    # Per-row threshold from the same category's expenses in the preceding window (a time offset
+    # such as '90D', or a number of expenses), excluding the expense itself. NaN until min_periods.
+    ordered = df.sort_values(['category', 'date'], kind='stable')
+    grouped = ordered.groupby('category', observed=True, sort=False)
+    if isinstance(window, int):
+        shifted = grouped['amount'].shift(1)
+        rolling = shifted.groupby(ordered['category'], observed=True, sort=False).rolling(window, min_periods=min_periods)
+        mean, std = rolling.mean().droplevel(0), rolling.std().droplevel(0)
+    else:
+        rolling = grouped.rolling(window, on='date', closed='left', min_periods=min_periods)['amount']
+        mean = pd.Series(rolling.mean().to_numpy(), index=ordered.index)
+        std = pd.Series(rolling.std().to_numpy(), index=ordered.index)
+    return (mean + k * std).reindex(df.index)
+
+def find_rolling_anomalies(df, window=ROLLING_WINDOW, k=ANOMALY_STD_MULTIPLIER, min_periods=MIN_HISTORY):
+    # Expenses above mean + k*std of their category's recent history
+    if df.empty:
+        return df.assign(threshold=pd.Series(dtype='float64'))
+    thresholds = rolling_thresholds(df, window, k, min_periods)
+    mask = df['amount'] > thresholds
+    return df[mask].assign(threshold=thresholds[mask])
+
+# --- Running Statistics ---
+def load_expense_stats(username):
+    # count/mean/std per category from the running statistics
+    return cached_frame(username, 'expense_stats', lambda: _query_expense_stats(username))
+
+def _query_expense_stats(username):
+    with get_connection() as conn:
+        rows = conn.execute('SELECT category, count, mean, m2 FROM expense_stats WHERE username = ? ORDER BY category',
+                            (username,)).fetchall()
+    df = pd.DataFrame(rows, columns=['category', 'count', 'mean', 'm2'])
+    df['std'] = (df['m2'] / (df['count'] - 1)).where(df['count'] > 1).pow(0.5)
+    return df.drop(columns='m2')
+
+def expense_threshold(username, category, k=ANOMALY_STD_MULTIPLIER, min_history=MIN_HISTORY):
+    # mean + k*std of the category's expenses so far, or None with too little history
+    with get_connection() as conn:
+        row = conn.execute('SELECT count, mean, m2 FROM expense_stats WHERE username = ? AND category = ?',
+                           (username, category)).fetchone()
+    if row is None or row[0] < max(2, min_history):
+        return None
+    count, mean, m2 = row
+    return mean + k * math.sqrt(m2 / (count - 1))
+
+def is_anomalous(username, category, amount, k=ANOMALY_STD_MULTIPLIER, min_history=MIN_HISTORY):
+    # Checks a new expense against the history before it is saved; returns (flagged, threshold)
+    threshold = expense_threshold(username, category, k, min_history)
+    return (threshold is not None and float(amount) > threshold), threshold
@@ -0,0 +1,347 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs, unquote
+from db import get_connection, init_db
+from cache import data_signature
+from auth import login, issue_session_token, verify_session_token
+from transactions import (query_transactions, save_transaction, save_transactions_bulk, save_budget,
+                          budget_status, HISTORY_PAGE_SIZE, DATE_FORMAT)
+from jobs import submit_job, get_job
+
+# --- JSON API ---
+# A small asyncio HTTP/1.1 server over the same data layer as the app. Handlers run on a thread
+# pool (SQLite and pandas block); the event loop only parses requests and writes responses.
+# Authenticate with POST /login, then send "Authorization: Bearer <token>".
+#
+#   POST /login                  {"username", "password"} -> {"token"}
+#   GET  /transactions           ?type&category&start_date&end_date&order=asc|desc&cursor&limit
+#   POST /transactions           {"date", "type", "category", "amount", "description"}
+#   POST /transactions/bulk      {"transactions": [...], "skip_duplicates": false}
+#   GET  /budgets                budgets with spent/remaining for ?as_of (default today)
+#   POST /budgets                {"category", "budget_amount", "period"}
+#   POST /forecast               {"model_type", "num_days", "mode"} -> 202 {"job_id"}
+#   GET  /jobs/<id>              job status, progress and result
+#
+# GET responses carry an ETag; a matching If-None-Match gets 304 Not Modified.
+API_WORKERS = 8
+API_MAX_BODY = 10 * 1024 * 1024
+API_MAX_PAGE = 1000
+TRANSACTION_TYPES = ('income', 'expense')
+DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+_executor = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="api")
+
+REASONS = {200: 'OK', 201: 'Created', 202: 'Accepted', 304: 'Not Modified', 400: 'Bad Request', 401: 'Unauthorized',
+           404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large', 429: 'Too Many Requests',
+           500: 'Internal Server Error'}
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _json_body(request):
+    try:
+        body = json.loads(request['body'] or b'{}')
+    except ValueError:
+        raise ApiError(400, "Request body must be JSON.")
+    if not isinstance(body, dict):
+        raise ApiError(400, "Request body must be a JSON object.")
+    return body
+
+def _param(request, name, default=None):
+    values = request['query'].get(name)
+    return values[0] if values else default
+
+def _int_param(request, name, default):
+    try:
+        return int(_param(request, name, default))
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name} must be an integer.")
+
+def _user(request):
+    header = request['headers'].get('authorization', '')
+    username = verify_session_token(header[7:]) if header.lower().startswith('bearer ') else None
+    if not username:
+        raise ApiError(401, "Missing or invalid session token.")
+    return username
+
+def _etag(username, resource, request, *extra):
+    # The database signature is the same in every process, so ETags survive restarts and other writers
+    key = json.dumps([username, resource, data_signature(username), sorted(request['query'].items()), *extra])
+    return '"' + hashlib.sha1(key.encode('utf-8')).hexdigest() + '"'
+
+def _transaction_error(row):
+    # The data layer accepts any date/type strings; the API only stores ones it can read back
+    date = row.get('date')
+    if not isinstance(date, str) or not DATE_PATTERN.fullmatch(date):
+        return "date must be a YYYY-MM-DD string."
+    try:
+        datetime.strptime(date, DATE_FORMAT)
+    except ValueError:
+        return "date must be a YYYY-MM-DD string."
+    if row.get('type') not in TRANSACTION_TYPES:
+        return f"type must be one of: {', '.join(TRANSACTION_TYPES)}."
+    if not isinstance(row.get('description', ''), str):
+        return "description must be a string."
+    return None
+
+def _records(df):
+    df = df.copy()
+    # Unparseable dates stored by other writers come back as null rather than NaN (invalid JSON)
+    df['date'] = df['date'].dt.strftime('%Y-%m-%d').astype(object).where(df['date'].notna(), None)
+    return [{k: (v.item() if hasattr(v, 'item') else v) for k, v in row.items()}
+            for row in df.astype({'type': object, 'category': object, 'username': object}).to_dict('records')]
+
+# --- Handlers ---
+# Each takes the parsed request and returns (status, payload) or (status, payload, etag); all run on the pool.
+def handle_login(request):
+    body = _json_body(request)
+    success, message = login(str(body.get('username', '')), str(body.get('password', '')))
+    if not success:
+        raise ApiError(429 if message.startswith("Too many") else 401, message)
+    return 200, {'token': issue_session_token(body['username'])}
+
+def handle_get_transactions(request):
+    username = _user(request)
+    etag = _etag(username, 'transactions', request)
+    if request['headers'].get('if-none-match') == etag:
+        return 304, None, etag
+    cursor = _param(request, 'cursor')
+    if cursor:
+        date, _, id = cursor.rpartition('|')
+        if not date or not id.isdigit():
+            raise ApiError(400, "Invalid cursor.")
+        cursor = (date, int(id))
+    limit = min(max(1, _int_param(request, 'limit', HISTORY_PAGE_SIZE)), API_MAX_PAGE)
+    page, total, next_cursor = query_transactions(
+        username, type=_param(request, 'type'), category=_param(request, 'category'),
+        start_date=_param(request, 'start_date'), end_date=_param(request, 'end_date'),
+        descending=_param(request, 'order', 'desc') != 'asc', cursor=cursor, limit=limit)
+    return 200, {
+        'transactions': _records(page),
+        'total': total,
+        'next_cursor': f"{next_cursor[0]}|{next_cursor[1]}" if next_cursor else None,
+    }, etag
+
+def handle_post_transaction(request):
+    username = _user(request)
+    body = _json_body(request)
+    error = _transaction_error(body)
+    if error:
+        raise ApiError(400, error)
+    success, message = save_transaction(username, body.get('date'), body.get('type'), body.get('category'),
+                                        body.get('amount'), body.get('description', ''))
+    if not success:
+        raise ApiError(400, message)
+    return 201, {'message': message}
+
+def handle_post_transactions_bulk(request):
+    username = _user(request)
+    body = _json_body(request)
+    rows = body.get('transactions')
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ApiError(400, "transactions must be a list of objects.")
+    errors = [_transaction_error(row) for row in rows]
+    saved = iter(save_transactions_bulk(username, [row for row, error in zip(rows, errors) if not error],
+                                        skip_duplicates=bool(body.get('skip_duplicates', False))))
+    results = [(False, error) if error else next(saved) for error in errors]
+    return 200, {
+        'saved': sum(1 for ok, _ in results if ok),
+        'results': [{'success': ok, 'message': message} for ok, message in results],
+    }
+
+def handle_get_budgets(request):
+    username = _user(request)
+    # Resolved here so the ETag of a default (today) request changes with the date
+    as_of = _param(request, 'as_of') or datetime.today().strftime(DATE_FORMAT)
+    etag = _etag(username, 'budgets', request, as_of)
+    if request['headers'].get('if-none-match') == etag:
+        return 304, None, etag
+    status = budget_status(username, as_of)
+    return 200, {'budgets': [{k: (v.item() if hasattr(v, 'item') else v) for k, v in row.items()}
+                             for row in status.to_dict('records')]}, etag
+
+def handle_post_budget(request):
+    username = _user(request)
+    body = _json_body(request)
+    try:
+        success, message = save_budget(username, body.get('category'), body.get('budget_amount', 0), body.get('period', 'all'))
+    except (TypeError, ValueError):
+        raise ApiError(400, "budget_amount must be a number.")
+    if not success:
+        raise ApiError(400, message)
+    return 201, {'message': message}
+
+def handle_post_forecast(request):
+    from ml_model import MODEL_CLASSES, FORECAST_MODES
+    username = _user(request)
+    body = _json_body(request)
+    model_type = body.get('model_type', 'RandomForest')
+    mode = body.get('mode', 'recursive')
+    if model_type not in MODEL_CLASSES:
+        raise ApiError(400, f"model_type must be one of: {', '.join(MODEL_CLASSES)}.")
+    if mode not in FORECAST_MODES:
+        raise ApiError(400, f"mode must be one of: {', '.join(FORECAST_MODES)}.")
+    try:
+        num_days = int(body.get('num_days', 30))
+    except (TypeError, ValueError):
+        raise ApiError(400, "num_days must be an integer.")
+    if not 1 <= num_days <= 365:
+        raise ApiError(400, "num_days must be between 1 and 365.")
+    job_id = submit_job(username, 'forecast', {'model_type': model_type, 'num_days': num_days, 'mode': mode},
+                        group={'model_type': model_type})
+    return 202, {'job_id': job_id, 'status': get_job(job_id)['status']}
+
+def handle_get_job(request, job_id):
+    username = _user(request)
+    job = get_job(int(job_id))
+    if job is None or job['username'] != username:
+        raise ApiError(404, "Job not found.")
+    return 200, {k: job[k] for k in ('id', 'kind', 'params', 'status', 'progress', 'result', 'error',
+                                      'created_at', 'started_at', 'finished_at')}
+
+ROUTES = {
+    ('POST', '/login'): handle_login,
+    ('GET', '/transactions'): handle_get_transactions,
+    ('POST', '/transactions'): handle_post_transaction,
+    ('POST', '/transactions/bulk'): handle_post_transactions_bulk,
+    ('GET', '/budgets'): handle_get_budgets,
+    ('POST', '/budgets'): handle_post_budget,
+    ('POST', '/forecast'): handle_post_forecast,
+}
+
+def _route(method, path):
+    if (method, path) in ROUTES:
+        return ROUTES[(method, path)], ()
+    parts = path.strip('/').split('/')
+    if len(parts) == 2 and parts[0] == 'jobs' and parts[1].isdigit():
+        if method != 'GET':
+            raise ApiError(405, "Method not allowed.")
+        return handle_get_job, (parts[1],)
+    if any(p == path for _, p in ROUTES):
+        raise ApiError(405, "Method not allowed.")
+    raise ApiError(404, "Not found.")
+
+async def dispatch(method, target, headers, body=b''):
+    # Runs one request; returns (status, response headers, body bytes). headers keys are lower-case.
+    url = urlsplit(target)
+    request = {'method': method, 'path': unquote(url.path), 'query': parse_qs(url.query),
+               'headers': headers, 'body': body}
+    try:
+        handler, args = _route(method, request['path'])
+        result = await asyncio.get_running_loop().run_in_executor(_executor, lambda: handler(request, *args))
+        status, payload, etag = result if len(result) == 3 else (*result, None)
+    except ApiError as e:
+        status, payload, etag = e.status, {'error': str(e)}, None
+    except Exception as e:
+        status, payload, etag = 500, {'error': f"Internal error: {e}"}, None
+    response_headers = {'Content-Type': 'application/json'}
+    if etag:
+        response_headers['ETag'] = etag
+    data = b'' if status == 304 else json.dumps(payload, default=str).encode('utf-8')
+    return status, response_headers, data
+
+# --- HTTP Server ---
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, version = request_line.decode('latin-1').split()
+    except ValueError:
+        raise ApiError(400, "Malformed request line.")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        raise ApiError(400, "Invalid Content-Length.")
+    if length < 0:
+        raise ApiError(400, "Invalid Content-Length.")
+    if length > API_MAX_BODY:
+        raise ApiError(413, "Request body too large.")
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), target, version, headers, body
+
+def _write_response(writer, status, headers, body, keep_alive):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+             *(f"{k}: {v}" for k, v in headers.items()),
+             f"Content-Length: {len(body)}",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}", '', '']
+    writer.write('\r\n'.join(lines).encode('latin-1') + body)
+
+async def _serve_connection(reader, writer):
+    try:
+        while True:
+            try:
+                parsed = await _read_request(reader)
+            except ApiError as e:
+                _write_response(writer, e.status, {'Content-Type': 'application/json'},
+                                json.dumps({'error': str(e)}).encode('utf-8'), False)
+                break
+            if parsed is None:
+                break
+            method, target, version, headers, body = parsed
+            keep_alive = headers.get('connection', '').lower() != 'close' and version != 'HTTP/1.0'
+            status, response_headers, data = await dispatch(method, target, headers, body)
+            _write_response(writer, status, response_headers, data, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(host='127.0.0.1', port=8000):
+    init_db()
+    server = await asyncio.start_server(_serve_connection, host, port)
+    print(f"SmartFinTrack API listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+# --- In-Process Client ---
+class ApiClient:
+    # Calls the API without a socket, e.g. for scripts and tests:
+    #   client = ApiClient(); client.login('alice', 'secret'); client.get('/transactions')
+    def __init__(self, token=None):
+        self.token = token
+
+    def request(self, method, path, json_body=None, headers=None):
+        # Returns (status, headers, parsed JSON or None)
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        if self.token:
+            headers.setdefault('authorization', f"Bearer {self.token}")
+        body = json.dumps(json_body).encode('utf-8') if json_body is not None else b''
+        status, response_headers, data = asyncio.run(dispatch(method.upper(), path, headers, body))
+        return status, response_headers, json.loads(data) if data else None
+
+    def get(self, path, headers=None):
+        return self.request('GET', path, headers=headers)
+
+    def post(self, path, json_body=None, headers=None):
+        return self.request('POST', path, json_body, headers)
+
+    def login(self, username, password):
+        status, _, payload = self.post('/login', {'username': username, 'password': password})
+        if status == 200:
+            self.token = payload['token']
+        return status, payload
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the SmartFinTrack JSON API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
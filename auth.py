@@ -1,34 +1,190 @@
+import base64
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from db import get_connection
 import bcrypt
 
-def load_users():
+# --- Password Hashing ---
+# bcrypt runs on a small shared pool (it releases the GIL), so a burst of logins queues up
+# instead of occupying every core. Existing hashes keep their own cost and are upgraded on login.
+BCRYPT_ROUNDS = 12
+HASH_WORKERS = 2
+
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_dummy_hash = None
+
+def hash_password(password):
+    return _hash_executor.submit(
+        lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')).result()
+
+def check_password(password, hashed):
+    def check():
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+        except Exception:
+            return False
+    return _hash_executor.submit(check).result()
+
+def _dummy_password_hash():
+    # Checked for unknown usernames so they take as long as a wrong password (same cost as real hashes).
+    # Built on first use so importing the module stays cheap.
+    global _dummy_hash
+    if _dummy_hash is None or _hash_rounds(_dummy_hash) != BCRYPT_ROUNDS:
+        _dummy_hash = hash_password("dummy-password")
+    return _dummy_hash
+
+def _hash_rounds(hashed):
+    # $2b$12$... -> 12
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+# --- Users ---
+def get_user(username):
     with get_connection() as conn:
-        c = conn.cursor()
-        c.execute('SELECT username, password FROM users')
-        rows = c.fetchall()
-        return [{'username': row[0], 'password': row[1]} for row in rows]
+        row = conn.execute('SELECT username, password, session_epoch FROM users WHERE username = ?', (username,)).fetchone()
+    return {'username': row[0], 'password': row[1], 'session_epoch': row[2]} if row else None
+
+def list_users(after=None, limit=50):
+    # Usernames in order, one page at a time: pass the last username of a page as `after` for the next
+    with get_connection() as conn:
+        rows = conn.execute('SELECT username FROM users WHERE username > ? ORDER BY username LIMIT ?',
+                            (after or '', limit)).fetchall()
+    return [row[0] for row in rows]
 
 def add_user(username, password):
     if not username or not password or len(username.strip()) < 3 or len(password) < 6:
         return False, "Username must be at least 3 chars and password at least 6 chars."
+    if get_user(username):
+        return False, "Username already exists."
+    hashed = hash_password(password)
     with get_connection() as conn:
-        c = conn.cursor()
-        c.execute('SELECT 1 FROM users WHERE username = ?', (username,))
-        if c.fetchone():
-            return False, "Username already exists."
-        hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        c.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, hashed))
-        return True, "Account created successfully."
+        inserted = conn.execute('INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)', (username, hashed)).rowcount
+    if not inserted:
+        return False, "Username already exists."
+    return True, "Account created successfully."
 
 def verify_user(username, password):
+    user = get_user(username)
+    if not user:
+        check_password(password, _dummy_password_hash())
+        return False
+    if not check_password(password, user['password']):
+        return False
+    if _hash_rounds(user['password']) != BCRYPT_ROUNDS:
+        with get_connection() as conn:
+            conn.execute('UPDATE users SET password = ? WHERE username = ?', (hash_password(password), username))
+    return True
+
+# --- Login Throttling ---
+# Per-username failed attempts in this process; after LOGIN_MAX_FAILURES failures within
+# LOGIN_WINDOW seconds further attempts are refused (without hashing) until the window passes.
+# At most LOGIN_TRACKED_USERS usernames are tracked: expired entries are swept first, then the oldest dropped.
+LOGIN_MAX_FAILURES = 5
+LOGIN_WINDOW = 300
+LOGIN_TRACKED_USERS = 10000
+
+_failures = {}
+_failures_lock = threading.Lock()
+
+def login_retry_after(username):
+    # Seconds until the username may try again (0 if not throttled)
+    now = time.monotonic()
+    with _failures_lock:
+        attempts = _failures.get(username)
+        if not attempts:
+            return 0
+        while attempts and attempts[0] <= now - LOGIN_WINDOW:
+            attempts.popleft()
+        if not attempts:
+            del _failures[username]
+            return 0
+        if len(attempts) < LOGIN_MAX_FAILURES:
+            return 0
+        return int(attempts[0] + LOGIN_WINDOW - now) + 1
+
+def login(username, password):
+    # Returns (success, message)
+    retry_after = login_retry_after(username)
+    if retry_after:
+        return False, f"Too many failed attempts. Try again in {retry_after} seconds."
+    if verify_user(username, password):
+        with _failures_lock:
+            _failures.pop(username, None)
+        return True, "Login successful."
+    _record_failure(username)
+    return False, "Invalid username or password."
+
+def _record_failure(username):
+    now = time.monotonic()
+    with _failures_lock:
+        # Re-insert so the dict stays ordered by latest failure
+        attempts = _failures.pop(username, None) or deque(maxlen=LOGIN_MAX_FAILURES)
+        attempts.append(now)
+        _failures[username] = attempts
+        if len(_failures) > LOGIN_TRACKED_USERS:
+            for name in [name for name, times in _failures.items() if times[-1] <= now - LOGIN_WINDOW]:
+                del _failures[name]
+            while len(_failures) > LOGIN_TRACKED_USERS:
+                del _failures[next(iter(_failures))]
+
+# --- Session Tokens ---
+# "<payload>.<signature>" where payload is base64url("username|expires|epoch") and the signature an
+# HMAC-SHA256 with SESSION_SECRET (default: a random secret generated once and stored in the database).
+# Tokens stop working when they expire or when revoke_sessions bumps the user's session epoch.
+# The app keeps the token in the page URL (?session=), where it can end up in browser history and
+# shared links, so it is kept short-lived.
+SESSION_TTL = 12 * 3600
+SESSION_SECRET = None
+
+_secret = None
+_secret_lock = threading.Lock()
+
+def _session_secret():
+    global _secret
+    if SESSION_SECRET:
+        return SESSION_SECRET.encode('utf-8')
+    with _secret_lock:
+        if _secret is None:
+            with get_connection() as conn:
+                conn.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('session_secret', ?)", (secrets.token_hex(32),))
+                _secret = conn.execute("SELECT value FROM settings WHERE key = 'session_secret'").fetchone()[0].encode('utf-8')
+        return _secret
+
+def _sign(payload):
+    return hmac.new(_session_secret(), payload.encode('ascii'), hashlib.sha256).hexdigest()
+
+def issue_session_token(username, ttl=SESSION_TTL):
+    user = get_user(username)
+    if not user:
+        return None
+    raw = f"{username}|{int(time.time()) + ttl}|{user['session_epoch']}"
+    payload = base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+    return f"{payload}.{_sign(payload)}"
+
+def verify_session_token(token):
+    # Username the token was issued to, or None if it is invalid, expired or revoked
+    try:
+        payload, signature = token.split('.')
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        raw = base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)).decode('utf-8')
+        username, expires, epoch = raw.rsplit('|', 2)
+        if int(expires) < time.time():
+            return None
+    except (ValueError, UnicodeError, AttributeError):
+        return None
+    user = get_user(username)
+    if not user or user['session_epoch'] != int(epoch):
+        return None
+    return username
+
+def revoke_sessions(username):
     with get_connection() as conn:
-        c = conn.cursor()
-        c.execute('SELECT password FROM users WHERE username = ?', (username,))
-        row = c.fetchone()
-        if not row:
-            return False
-        hashed = row[0]
-        try:
-            return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
-        except Exception:
-            return False 
\ No newline at end of file
+        conn.execute('UPDATE users SET session_epoch = session_epoch + 1 WHERE username = ?', (username,))
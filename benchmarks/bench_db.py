@@ -0,0 +1,178 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+from datagen import generate_users, write_to_db
+from transactions import _query_transactions, save_transaction, save_budget, delete_all_transactions, add_demo_transactions
+from rollups import _query_rollups
+
+# --- Data Layer Load Benchmark ---
+# Fills a scratch database with N users x M transactions, then runs concurrent simulated sessions
+# (threads, processes or both) against the same file and reports latency percentiles, throughput
+# and "database is locked" errors per operation.
+# Usage: python benchmarks/bench_db.py --users 50 --transactions 2000 --sessions 16 --mode both
+DEMO_ROWS_PER_DAY = 1.35  # average rows per day written by datagen
+RESEED_DAYS = 30  # history re-added after a session deletes a user's transactions
+
+# Operation weights; a session picks operations at random with these odds
+MIXES = {
+    'default': {'load_transactions': 30, 'weekly_report': 20, 'monthly_report': 20,
+                'save_transaction': 20, 'save_budget': 8, 'delete_all_transactions': 2},
+    'read_heavy': {'load_transactions': 45, 'weekly_report': 25, 'monthly_report': 25,
+                   'save_transaction': 4, 'save_budget': 1},
+    'write_heavy': {'load_transactions': 10, 'weekly_report': 5, 'monthly_report': 5,
+                    'save_transaction': 65, 'save_budget': 10, 'delete_all_transactions': 5},
+}
+CATEGORIES = ['Groceries', 'Dining Out', 'Shopping', 'Healthcare', 'Utilities']
+
+def _username(i):
+    return f"bench_user_{i}"
+
+def populate(users, transactions_per_user, seed=0):
+    db.init_db()
+    days = max(1, math.ceil(transactions_per_user / DEMO_ROWS_PER_DAY))
+    write_to_db(generate_users([_username(i) for i in range(users)], days, seed))
+    with db.get_connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+
+def _operation(name, username, rng):
+    if name == 'load_transactions':
+        _query_transactions(username)
+    elif name == 'weekly_report':
+        _query_rollups(username, 'week', None, False)
+    elif name == 'monthly_report':
+        _query_rollups(username, 'month', None, False)
+    elif name == 'save_transaction':
+        date = (datetime.today() - timedelta(days=rng.randrange(365))).strftime('%Y-%m-%d')
+        save_transaction(username, date, 'expense', rng.choice(CATEGORIES), round(rng.uniform(50, 2000), 2),
+                         f"bench {rng.random():.12f}")
+    elif name == 'save_budget':
+        save_budget(username, rng.choice(CATEGORIES), round(rng.uniform(1000, 20000), 2))
+    elif name == 'delete_all_transactions':
+        delete_all_transactions(username)
+    else:
+        raise ValueError(f"Unknown operation: {name}")
+
+def run_session(db_path, users, ops, mix, seed):
+    # One simulated user session; returns ([(operation, seconds, error kind or None)], started, finished)
+    db.DB_PATH = db_path
+    started = time.time()
+    rng = random.Random(seed)
+    names = list(MIXES[mix])
+    weights = list(MIXES[mix].values())
+    samples = []
+    for _ in range(ops):
+        name = rng.choices(names, weights)[0]
+        username = _username(rng.randrange(users))
+        error = None
+        start = time.perf_counter()
+        try:
+            _operation(name, username, rng)
+        except sqlite3.OperationalError as e:
+            error = 'locked' if 'locked' in str(e) or 'busy' in str(e) else 'error'
+        except Exception:
+            error = 'error'
+        samples.append((name, time.perf_counter() - start, error))
+        if name == 'delete_all_transactions' and error is None:
+            add_demo_transactions(username, n=RESEED_DAYS, seed=rng.randrange(2 ** 32))  # untimed, keeps the user's data realistic
+    return samples, started, time.time()
+
+def _process_init(db_path):
+    db.close_pool()
+    db.DB_PATH = db_path
+
+def run_load(db_path, mode, sessions, users, ops, mix, seed=0):
+    # Wall time runs from the first session start to the last session end, so process start-up is excluded
+    seeds = [seed * 1000 + i for i in range(sessions)]
+    if mode == 'thread':
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            results = list(pool.map(run_session, [db_path] * sessions, [users] * sessions, [ops] * sessions,
+                                    [mix] * sessions, seeds))
+    else:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=sessions, mp_context=context,
+                                 initializer=_process_init, initargs=(db_path,)) as pool:
+            results = list(pool.map(run_session, [db_path] * sessions, [users] * sessions, [ops] * sessions,
+                                    [mix] * sessions, seeds))
+    wall = max(finished for _, _, finished in results) - min(started for _, started, _ in results)
+    return summarize([sample for samples, _, _ in results for sample in samples], wall)
+
+def summarize(samples, wall):
+    by_op = {}
+    for name, seconds, error in samples:
+        by_op.setdefault(name, []).append((seconds, error))
+    report = {'operations': len(samples), 'wall_seconds': wall,
+              'throughput_ops': len(samples) / wall if wall else 0.0,
+              'locked_errors': sum(1 for _, _, error in samples if error == 'locked'),
+              'other_errors': sum(1 for _, _, error in samples if error == 'error'),
+              'by_operation': {}}
+    for name, entries in sorted(by_op.items()):
+        ms = np.array([seconds for seconds, _ in entries]) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        report['by_operation'][name] = {
+            'count': len(entries), 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99, 'max_ms': float(ms.max()),
+            'locked_errors': sum(1 for _, error in entries if error == 'locked'),
+            'other_errors': sum(1 for _, error in entries if error == 'error'),
+        }
+    return report
+
+def print_report(label, report):
+    print(f"\n== {label}: {report['operations']} ops in {report['wall_seconds']:.2f}s "
+          f"({report['throughput_ops']:.0f} ops/s), locked={report['locked_errors']}, errors={report['other_errors']}")
+    print(f"{'operation':<24}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'locked':>8}")
+    for name, s in report['by_operation'].items():
+        print(f"{name:<24}{s['count']:>7}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}"
+              f"{s['max_ms']:>10.2f}{s['locked_errors']:>8}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the SQLite data layer with concurrent sessions.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--transactions", type=int, default=1000, help="Approximate transactions per user")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions (threads or processes)")
+    parser.add_argument("--ops", type=int, default=200, help="Operations per session")
+    parser.add_argument("--mode", choices=['thread', 'process', 'both'], default='both')
+    parser.add_argument("--mix", choices=list(MIXES), default='default')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="Scratch database path (default: a temporary file, deleted afterwards)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    workdir = None
+    db_path = args.db
+    if db_path is None:
+        workdir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(workdir.name, 'bench.db')
+    db.DB_PATH = db_path
+    start = time.perf_counter()
+    rows = populate(args.users, args.transactions, args.seed)
+    print(f"Populated {rows} transactions for {args.users} users in {time.perf_counter() - start:.1f}s ({db_path})")
+    db.close_pool()
+
+    report = {'config': vars(args), 'rows': rows, 'runs': {}}
+    for mode in (['thread', 'process'] if args.mode == 'both' else [args.mode]):
+        result = run_load(db_path, mode, args.sessions, args.users, args.ops, args.mix, args.seed)
+        report['runs'][mode] = result
+        print_report(f"{mode} x{args.sessions} ({args.mix})", result)
+        db.close_pool()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if workdir is not None:
+        workdir.cleanup()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from datagen import generate_transactions
+from ml_model import preprocess_data, train_model_on_features, predict_future_expenses, MODEL_CLASSES, FORECAST_MODES
+
+# --- ML Pipeline Benchmark ---
+# Times preprocess / train / forecast per model type over synthetic histories of increasing length.
+# Usage: python benchmarks/bench_ml.py --output results.json [--baseline baseline.json]
+DEFAULT_SIZES = [90, 365, 1825, 7300]  # days: 3 months .. 20 years
+DEFAULT_HORIZONS = [7, 30, 90]
+DEFAULT_TOLERANCE = 0.25  # relative slowdown that counts as a regression
+
+def synthetic_expenses(days, seed=0):
+    # Expense rows of a reproducible demo history
+    df = generate_transactions(days, seed)
+    return df[df['type'] == 'expense'].reset_index(drop=True)
+
+def _timed(fn, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+def _peak_mb(fn):
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+def run_benchmarks(sizes, models, horizons, repeat=3, measure_memory=True):
+    results = []
+    def record(**entry):
+        results.append(entry)
+        print(f"{entry['days']:>6}d {entry['model']:<12} {entry['stage']:<10} "
+              f"{entry.get('horizon') or '':>4} {entry.get('mode') or '':<9} {entry['seconds'] * 1000:10.2f} ms"
+              + (f" {entry['peak_mb']:8.1f} MB" if entry.get('peak_mb') is not None else ''))
+    for days in sizes:
+        df = synthetic_expenses(days, seed=days)
+        seconds, features_df = _timed(lambda: preprocess_data(df), repeat)
+        record(days=days, rows=len(df), model='-', stage='preprocess', seconds=seconds,
+               peak_mb=_peak_mb(lambda: preprocess_data(df)) if measure_memory else None)
+        for model_type in models:
+            seconds, trained = _timed(lambda: train_model_on_features(features_df, model_type), repeat)
+            model, scaler, metrics, features = trained
+            if model is None:
+                print(f"{days:>6}d {model_type:<12} skipped: {metrics}")
+                continue
+            record(days=days, rows=len(df), model=model_type, stage='train', seconds=seconds,
+                   peak_mb=_peak_mb(lambda: train_model_on_features(features_df, model_type)) if measure_memory else None,
+                   mae=metrics[0], r2=metrics[1])
+            for horizon in horizons:
+                for mode in FORECAST_MODES:
+                    forecast = lambda: predict_future_expenses(model, scaler, None, horizon, features, mode=mode, preprocessed_df=features_df)
+                    seconds, _ = _timed(forecast, repeat)
+                    record(days=days, rows=len(df), model=model_type, stage='forecast', horizon=horizon, mode=mode, seconds=seconds,
+                           peak_mb=_peak_mb(forecast) if measure_memory else None)
+    return results
+
+def _key(entry):
+    return (entry['days'], entry['model'], entry['stage'], entry.get('horizon'), entry.get('mode'))
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    # Returns the entries that got slower than baseline by more than `tolerance`
+    previous = {_key(entry): entry for entry in baseline['results']}
+    regressions = []
+    for entry in results:
+        old = previous.get(_key(entry))
+        if old is None or old['seconds'] <= 0:
+            continue
+        ratio = entry['seconds'] / old['seconds']
+        if ratio > 1 + tolerance:
+            regressions.append({**entry, 'baseline_seconds': old['seconds'], 'ratio': ratio})
+    return regressions
+
+def _metadata():
+    import sklearn
+    import xgboost
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'xgboost': xgboost.__version__,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the expense forecasting pipeline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="History lengths in days")
+    parser.add_argument("--models", nargs="+", default=list(MODEL_CLASSES), choices=list(MODEL_CLASSES))
+    parser.add_argument("--horizons", type=int, nargs="+", default=DEFAULT_HORIZONS, help="Forecast horizons in days")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (median is reported)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc peak-memory runs")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare against a previously saved results JSON")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+    results = run_benchmarks(args.sizes, args.models, args.horizons, args.repeat, not args.no_memory)
+    report = {'meta': _metadata(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['days']}d {r['model']} {r['stage']} {r.get('horizon') or ''} {r.get('mode') or ''}: "
+                  f"{r['baseline_seconds'] * 1000:.2f} ms -> {r['seconds'] * 1000:.2f} ms ({r['ratio']:.2f}x)")
+        if regressions:
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import argparse
+import ast
+import os
+import re
+import subprocess
+import sys
+import time
+
+# --- Startup Import Profiler ---
+# Runs main.py's top-level imports in a fresh interpreter under `python -X importtime` and reports
+# the cumulative import time of each module they pull in, slowest first.
+# Usage: python benchmarks/bench_startup.py [--top 25] [--extra ml_model plotly.express]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+def top_level_imports(path):
+    # Source of the module-level import statements of a script
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    tree = ast.parse(source)
+    return '\n'.join(ast.get_source_segment(source, node) for node in tree.body
+                     if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+def profile_imports(code):
+    # Returns ([(module, self_us, cumulative_us, depth)], wall seconds) for running `code`
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                            capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return entries, wall
+
+def report(title, entries, wall, top):
+    roots = [e for e in entries if e[3] == 0]
+    total = sum(e[2] for e in roots)
+    print(f"\n== {title}: {total / 1e6:.2f}s of imports, {wall:.2f}s interpreter wall time, {len(entries)} modules")
+    print(f"{'module':<45}{'cumulative ms':>15}{'self ms':>10}")
+    for module, self_us, cumulative_us, _ in sorted(roots, key=lambda e: -e[2])[:top]:
+        print(f"{module:<45}{cumulative_us / 1000:>15.1f}{self_us / 1000:>10.1f}")
+    return total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the app's startup imports.")
+    parser.add_argument("--script", default=os.path.join(ROOT, 'main.py'))
+    parser.add_argument("--top", type=int, default=20, help="Top-level modules to list")
+    parser.add_argument("--extra", nargs="*", default=[],
+                        help="Also profile the startup imports plus these modules (e.g. ml_model plotly.express)")
+    args = parser.parse_args(argv)
+    code = top_level_imports(args.script)
+    entries, wall = profile_imports(code)
+    report(f"startup imports of {os.path.basename(args.script)}", entries, wall, args.top)
+    if args.extra:
+        entries, wall = profile_imports(code + '\n' + '\n'.join(f"import {name}" for name in args.extra))
+        report(f"startup + {' '.join(args.extra)}", entries, wall, args.top)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from db import get_connection
+
+# --- Per-User Data Versions ---
+# Every write path bumps the user's version, so cached reads keyed on (username, version)
+# never return stale data and old entries simply age out of the LRU. Writes made by another
+# process (the API server next to the app, an import script) are noticed through the user's
+# database signature, which is checked on every read of the version.
+# Each bump also records the earliest transaction date it touched, so incremental consumers
+# (the feature store) only recompute from that date: None = no transaction change (e.g. a budget),
+# FULL_CHANGE = unknown, recompute everything.
+FULL_CHANGE = ''
+CHANGE_LOG_SIZE = 256
+
+_versions = {}
+_changes = {}
+_signatures = {}
+_versions_lock = threading.Lock()
+
+def data_signature(username):
+    # Moves on every write to the user's transactions (triggers bump analytics_versions) or budgets,
+    # whichever process made it; unlike data_version it is the same in every process and across restarts
+    with get_connection() as conn:
+        versions = conn.execute('SELECT COALESCE(SUM(version), 0) FROM analytics_versions WHERE username = ?', (username,)).fetchone()[0]
+        count, total, keys = conn.execute('''SELECT COUNT(*), COALESCE(SUM(budget_amount), 0), COALESCE(GROUP_CONCAT(category || ':' || period), '')
+                                             FROM budgets WHERE username = ?''', (username,)).fetchone()
+    return f"{versions}/{count}:{total:.2f}:{hashlib.sha1(keys.encode('utf-8')).hexdigest()}"
+
+def _bump(username, changed_from):
+    version = _versions.get(username, 0) + 1
+    _versions[username] = version
+    _changes.setdefault(username, deque(maxlen=CHANGE_LOG_SIZE)).append((version, changed_from))
+    return version
+
+def data_version(username):
+    # Bumped first (as an unknown change) when the database signature moved without a write from this process
+    signature = data_signature(username)
+    with _versions_lock:
+        previous = _signatures.get(username)
+        _signatures[username] = signature
+        if previous is not None and previous != signature:
+            return _bump(username, FULL_CHANGE)
+        return _versions.get(username, 0)
+
+def bump_version(username, changed_from=FULL_CHANGE):
+    # Called after a write commits; the signature it left behind is recorded so the write isn't seen again
+    # as another process's. (A foreign write landing in between is taken for part of this one.)
+    signature = data_signature(username)
+    with _versions_lock:
+        _signatures[username] = signature
+        return _bump(username, changed_from)
+
+def changed_since(username, version):
+    # Earliest transaction date changed after `version` (FULL_CHANGE if unknown), or None if nothing changed
+    with _versions_lock:
+        log = _changes.get(username, ())
+        if version >= _versions.get(username, 0):
+            return None
+        if not log or log[0][0] > version + 1:
+            return FULL_CHANGE
+        dates = [changed_from for v, changed_from in log if v > version and changed_from is not None]
+        return min(dates) if dates else None
+
+# --- DataFrame Cache ---
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+class FrameCache:
+    # Process-wide LRU of DataFrames bounded by their in-memory size.
+    # Cached frames are shared between sessions and must be treated as read-only.
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        frame = loader()
+        size = int(frame.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = (frame, size)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self.bytes -= evicted_size
+                    self.evictions += 1
+        return frame
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+frame_cache = FrameCache()
+
+def cached_frame(username, name, loader):
+    # name identifies the query (and its arguments) within a user's data
+    return frame_cache.get_or_load((username, data_version(username), name), loader)
+
+def cache_stats():
+    return frame_cache.stats()
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from rollups import load_rollups
+
+# --- Chart Data ---
+# Time series for charts are kept under a point budget whatever the history length: the resolution
+# (day/week/month rollups) follows the visible range, and long raw series are thinned with LTTB
+# (Largest-Triangle-Three-Buckets), which keeps the visual shape including spikes.
+CHART_MAX_POINTS = 500
+CHART_MARKERS_MAX_POINTS = 120  # draw markers only on sparse series
+CHART_RANGES = {'3 months': 90, '1 year': 365, '5 years': 1825, 'All': None}
+RESOLUTIONS = [('day', 1), ('week', 7), ('month', 30.44)]  # granularity, days per point
+RESOLUTION_LABELS = {'day': 'Daily', 'week': 'Weekly', 'month': 'Monthly'}
+
+def resolution_for(days, max_points=CHART_MAX_POINTS):
+    # Finest rollup granularity that shows `days` days in at most max_points points
+    for granularity, step in RESOLUTIONS:
+        if days / step <= max_points:
+            return granularity
+    return RESOLUTIONS[-1][0]
+
+def period_dates(periods, granularity):
+    # Rollup period keys -> timestamps of the period start
+    fmt = '%Y-%m' if granularity == 'month' else '%Y' if granularity == 'year' else '%Y-%m-%d'
+    return pd.to_datetime(pd.Series(periods, dtype=object), format=fmt, errors='coerce')
+
+def chart_mode(n_points):
+    return 'lines+markers' if n_points <= CHART_MARKERS_MAX_POINTS else 'lines'
+
+def income_expense_series(username, range_days=None, max_points=CHART_MAX_POINTS, today=None):
+    # (frame with date/income/expense/net columns, granularity) for the last range_days days
+    # (None = all history), read from the rollups at the resolution that fits max_points
+    months = load_rollups(username, 'month', by_category=False)
+    if months.empty:
+        return pd.DataFrame(columns=['date', 'income', 'expense', 'net']), 'day'
+    end = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+    first = period_dates(months['period'], 'month').min()
+    start = end - pd.Timedelta(days=range_days - 1) if range_days else first
+    granularity = resolution_for(max(1, (end - max(start, first)).days + 1), max_points)
+    rollups = load_rollups(username, granularity, by_category=False)
+    frame = rollups.pivot_table(index='period', columns='type', values='total', aggfunc='sum', fill_value=0)
+    frame = frame.reindex(columns=['income', 'expense'], fill_value=0).reset_index()
+    frame['date'] = period_dates(frame['period'], granularity)
+    # Keep every period that overlaps the range (a week/month may start before it)
+    lower = start.to_period('M').to_timestamp() if granularity == 'month' else start - pd.Timedelta(days=6 if granularity == 'week' else 0)
+    frame = frame[frame['date'].notna() & (frame['date'] >= lower)]
+    frame = frame.assign(net=frame['income'] - frame['expense'])[['date', 'income', 'expense', 'net']]
+    return downsample(frame.reset_index(drop=True), 'date', 'expense', max_points), granularity
+
+def lttb_indices(x, y, n_out):
+    # Row positions of the LTTB selection of n_out points (first and last always kept); x must be sorted
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n) if n_out >= n else np.array([0, n - 1][:max(n_out, 0)], dtype=np.int64)
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out - 2 buckets over the inner points
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        next_lo, next_hi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        areas = np.abs((x[previous] - avg_x) * (y[lo:hi] - y[previous]) - (x[previous] - x[lo:hi]) * (avg_y - y[previous]))
+        previous = lo + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+def downsample(df, x, y, max_points=CHART_MAX_POINTS):
+    # At most max_points rows of df (sorted by x) chosen by LTTB on column y; other columns follow the rows
+    if len(df) <= max_points:
+        return df
+    xs = df[x]
+    if pd.api.types.is_datetime64_any_dtype(xs):
+        xs = xs.astype('int64')
+    return df.iloc[lttb_indices(xs.to_numpy(), df[y].to_numpy(), max_points)]
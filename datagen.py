@@ -0,0 +1,121 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+# --- Synthetic Data Generator ---
+# Builds whole transaction histories with NumPy: monthly salary, rent and utilities, weekly groceries,
+# daily spend with rare spikes, occasional extra expenses and occasional small income.
+# The same seed always produces the same rows, for any number of users and days.
+DATE_FORMAT = "%Y-%m-%d"
+GENERATED_COLUMNS = ['date', 'type', 'category', 'amount', 'description']
+DESCRIPTIONS = np.array(["Lunch", "Bus fare", "Movie", "Groceries", "Shopping", "Doctor", "Gift", "Dining", "Refund", "Bonus"])
+EXTRA_EXPENSE_CATEGORIES = np.array(["Shopping", "Dining Out", "Healthcare"])
+EXTRA_INCOME_CATEGORIES = np.array(["Gift", "Refund", "Bonus"])
+SPIKE_PROBABILITY = 0.05
+EXTRA_EXPENSE_PROBABILITY = 0.18  # 1-2 times a week
+EXTRA_INCOME_PROBABILITY = 0.05  # 1-2 times a month
+
+def generate_transactions(days, seed=None, end_date=None):
+    # One user's history of `days` days ending at end_date (default today), oldest first.
+    # seed may be an int, a np.random.SeedSequence or a Generator.
+    rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+    end = pd.Timestamp(end_date or pd.Timestamp.today()).normalize()
+    dates = pd.date_range(end=end, periods=days, freq='D')
+    labels = np.asarray(dates.strftime(DATE_FORMAT), dtype=object)
+    day_index = np.arange(days)
+    parts = []
+
+    def add(mask, type, category, low, high, description):
+        idx = day_index[mask]
+        n = len(idx)
+        parts.append((idx, np.full(n, type, dtype=object), np.broadcast_to(category, n).astype(object),
+                      rng.uniform(low, high, n), np.broadcast_to(description, n).astype(object)))
+
+    add(dates.day == 1, "income", "Salary", 20000, 21000, "Monthly Salary")
+    add(dates.day == 2, "expense", "Rent", 2800, 3200, "Monthly Rent")
+    add(dates.day == 5, "expense", "Utilities", 500, 600, "Utilities Bill")
+    add(dates.dayofweek == 0, "expense", "Groceries", 1100, 1200, "Weekly Groceries")
+
+    daily = rng.uniform(500, 550, days)
+    spikes = rng.random(days) < SPIKE_PROBABILITY
+    daily[spikes] += rng.uniform(50, 200, spikes.sum())
+    parts.append((day_index, np.full(days, "expense", dtype=object), np.full(days, "Daily Expenses", dtype=object),
+                  daily, DESCRIPTIONS[rng.integers(len(DESCRIPTIONS), size=days)].astype(object)))
+
+    extra = rng.random(days) < EXTRA_EXPENSE_PROBABILITY
+    n = extra.sum()
+    add(extra, "expense", EXTRA_EXPENSE_CATEGORIES[rng.integers(len(EXTRA_EXPENSE_CATEGORIES), size=n)], 300, 700,
+        DESCRIPTIONS[rng.integers(len(DESCRIPTIONS), size=n)])
+
+    income = rng.random(days) < EXTRA_INCOME_PROBABILITY
+    n = income.sum()
+    add(income, "income", EXTRA_INCOME_CATEGORIES[rng.integers(len(EXTRA_INCOME_CATEGORIES), size=n)], 800, 1200,
+        DESCRIPTIONS[rng.integers(len(DESCRIPTIONS), size=n)])
+
+    idx, types, categories, amounts, descriptions = (np.concatenate(column) for column in zip(*parts))
+    order = np.argsort(idx, kind='stable')  # by day, components in the order above
+    return pd.DataFrame({
+        'date': labels[idx[order]],
+        'type': types[order],
+        'category': categories[order],
+        'amount': amounts[order].round(2),
+        'description': descriptions[order],
+    }, columns=GENERATED_COLUMNS)
+
+def generate_users(usernames, days, seed=None, end_date=None):
+    # Histories for several users in one frame with a leading username column.
+    # Each user gets an independent stream spawned from seed, so adding users keeps earlier ones unchanged.
+    streams = np.random.SeedSequence(seed).spawn(len(usernames))
+    frames = []
+    for username, stream in zip(usernames, streams):
+        frame = generate_transactions(days, stream, end_date)
+        frame.insert(0, 'username', username)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=['username'] + GENERATED_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+def to_rows(df):
+    # Plain dicts for transactions.save_transactions_bulk (columns to lists first: row iteration is slow)
+    columns = [df[column].tolist() for column in GENERATED_COLUMNS]
+    return [dict(zip(GENERATED_COLUMNS, values)) for values in zip(*columns)]
+
+def write_to_db(df, username=None):
+    # Inserts generated rows through the bulk path; username is required when df has no username column
+    from transactions import save_transactions_bulk
+    if 'username' not in df.columns:
+        save_transactions_bulk(username, to_rows(df))
+        return len(df)
+    for user, rows in df.groupby('username', sort=False):
+        save_transactions_bulk(user, to_rows(rows))
+    return len(df)
+
+def write_fixture(df, path):
+    # .csv, .csv.gz or .parquet (Parquet needs pyarrow or fastparquet)
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate reproducible synthetic transaction histories.")
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--prefix", default="user_", help="Usernames are <prefix><n>")
+    parser.add_argument("--db", action="store_true", help="Insert into the app database")
+    parser.add_argument("--out", help="Write a .csv/.csv.gz/.parquet fixture")
+    args = parser.parse_args()
+    df = generate_users([f"{args.prefix}{i}" for i in range(args.users)], args.days, args.seed)
+    if args.out:
+        write_fixture(df, args.out)
+        print(f"Wrote {len(df)} rows to {os.path.abspath(args.out)}")
+    if args.db:
+        from db import init_db
+        init_db()
+        write_to_db(df)
+        print(f"Inserted {len(df)} rows for {args.users} users.")
+    if not args.out and not args.db:
+        print(df.head(20).to_string())
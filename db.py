@@ -1,26 +1,218 @@
 import sqlite3
 import os
+import hashlib
+import queue
 from contextlib import contextmanager
 
 DB_PATH = os.path.join(os.path.dirname(__file__), 'finance.db')
 
+# --- Connection Pool ---
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Connections are kept per database file so DB_PATH can be pointed elsewhere (e.g. a scratch db).
+_pools = {}
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def _pool_for(path):
+    pool = _pools.get(path)
+    if pool is None:
+        pool = _pools.setdefault(path, queue.LifoQueue(maxsize=POOL_SIZE))
+    return pool
+
 @contextmanager
 def get_connection():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    path = DB_PATH
+    pool = _pool_for(path)
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _connect(path)
     try:
         yield conn
+        # Only statements that opened a transaction (INSERT/UPDATE/DELETE) need a commit.
+        if conn.in_transaction:
+            conn.commit()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
     finally:
-        conn.commit()
-        conn.close()
+        try:
+            pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
 
-def init_db():
-    with get_connection() as conn:
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS users (
+def close_pool():
+    for pool in _pools.values():
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
+    _pools.clear()
+
+# --- Content Hashing ---
+# Identifies a transaction by what a bank statement would show, so re-imports can be skipped.
+def transaction_hash(username, date, amount, description):
+    key = f"{username}|{date}|{float(amount):.2f}|{(description or '').strip().lower()}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def _backfill_transaction_hashes(conn):
+    last_id = 0
+    while True:
+        rows = conn.execute('''SELECT id, username, date, amount, description FROM transactions
+                               WHERE id > ? ORDER BY id LIMIT 5000''', (last_id,)).fetchall()
+        if not rows:
+            break
+        conn.executemany('UPDATE transactions SET content_hash = ? WHERE id = ?',
+                         [(transaction_hash(u, d, a, desc), i) for i, u, d, a, desc in rows])
+        last_id = rows[-1][0]
+
+# --- Rollups ---
+# Period key of a transaction date for each rollup granularity. Weeks start on Sunday,
+# matching the Insights weekly report.
+ROLLUP_PERIODS = {
+    'day': "date({d})",
+    'week': "date({d}, '-' || strftime('%w', {d}) || ' days')",
+    'month': "strftime('%Y-%m', {d})",
+    'year': "strftime('%Y', {d})",
+}
+
+def _rollup_key(row, granularity):
+    period = ROLLUP_PERIODS[granularity].format(d=f'{row}.date')
+    return f"{row}.username, '{granularity}', COALESCE({period}, ''), COALESCE({row}.type, ''), COALESCE({row}.category, '')"
+
+def _rollup_add_sql(row):
+    return ''.join(f'''
+            INSERT INTO rollups (username, granularity, period, type, category, total, count)
+            VALUES ({_rollup_key(row, g)}, {row}.amount, 1)
+            ON CONFLICT (username, granularity, period, type, category)
+            DO UPDATE SET total = total + excluded.total, count = count + 1;''' for g in ROLLUP_PERIODS)
+
+def _rollup_remove_sql(row):
+    return ''.join(f'''
+            UPDATE rollups SET total = total - {row}.amount, count = count - 1
+            WHERE (username, granularity, period, type, category) = ({_rollup_key(row, g)});
+            DELETE FROM rollups
+            WHERE (username, granularity, period, type, category) = ({_rollup_key(row, g)}) AND count <= 0;''' for g in ROLLUP_PERIODS)
+
+def _create_rollup_triggers(conn):
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup_insert
+        AFTER INSERT ON transactions BEGIN{_rollup_add_sql('NEW')}
+        END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup_delete
+        AFTER DELETE ON transactions BEGIN{_rollup_remove_sql('OLD')}
+        END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup_update
+        AFTER UPDATE OF username, date, type, category, amount ON transactions BEGIN{_rollup_remove_sql('OLD')}{_rollup_add_sql('NEW')}
+        END''')
+
+def rebuild_rollups(conn, username=None):
+    # Recomputes rollups from raw transactions (backfill, or repair after manual edits)
+    where = 'WHERE username = ?' if username else ''
+    params = (username,) if username else ()
+    conn.execute(f'DELETE FROM rollups {where}', params)
+    for granularity, period in ROLLUP_PERIODS.items():
+        period = period.format(d='date')
+        conn.execute(f'''INSERT INTO rollups (username, granularity, period, type, category, total, count)
+                         SELECT username, '{granularity}', COALESCE({period}, ''), COALESCE(type, ''), COALESCE(category, ''),
+                                SUM(amount), COUNT(*)
+                         FROM transactions {where}
+                         GROUP BY 1, 3, 4, 5''', params)
+
+# --- Expense Statistics ---
+# Running count/mean/M2 (Welford) of expense amounts per user and category, so a new expense
+# can be compared with its category's mean + k*std without scanning history.
+def _expense_stats_key(row):
+    return f"{row}.username, COALESCE({row}.category, '')"
+
+def _expense_stats_add_sql(row):
+    # In an UPDATE SET every column reference reads the old row, so mean/m2 use the previous mean
+    return f'''
+            INSERT INTO expense_stats (username, category, count, mean, m2)
+            SELECT {_expense_stats_key(row)}, 1, {row}.amount, 0 WHERE {row}.type = 'expense'
+            ON CONFLICT (username, category) DO UPDATE SET
+                count = count + 1,
+                mean = mean + (excluded.mean - mean) / (count + 1),
+                m2 = m2 + (excluded.mean - mean) * (excluded.mean - (mean + (excluded.mean - mean) / (count + 1)));'''
+
+def _expense_stats_remove_sql(row):
+    return f'''
+            UPDATE expense_stats SET
+                count = count - 1,
+                mean = CASE WHEN count > 1 THEN (mean * count - {row}.amount) / (count - 1) ELSE 0 END,
+                m2 = CASE WHEN count > 1 THEN MAX(0, m2 - ({row}.amount - mean) * ({row}.amount - (mean * count - {row}.amount) / (count - 1))) ELSE 0 END
+            WHERE (username, category) = ({_expense_stats_key(row)}) AND {row}.type = 'expense';
+            DELETE FROM expense_stats WHERE (username, category) = ({_expense_stats_key(row)}) AND count <= 0;'''
+
+def _create_expense_stats_triggers(conn):
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_stats_insert
+        AFTER INSERT ON transactions BEGIN{_expense_stats_add_sql('NEW')}
+        END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_stats_delete
+        AFTER DELETE ON transactions BEGIN{_expense_stats_remove_sql('OLD')}
+        END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_stats_update
+        AFTER UPDATE OF username, type, category, amount ON transactions BEGIN{_expense_stats_remove_sql('OLD')}{_expense_stats_add_sql('NEW')}
+        END''')
+
+def rebuild_expense_stats(conn, username=None):
+    where = 'AND t.username = ?' if username else ''
+    params = (username,) if username else ()
+    conn.execute(f'DELETE FROM expense_stats {"WHERE username = ?" if username else ""}', params)
+    conn.execute(f'''INSERT INTO expense_stats (username, category, count, mean, m2)
+                     SELECT t.username, COALESCE(t.category, ''), COUNT(*), a.mean, SUM((t.amount - a.mean) * (t.amount - a.mean))
+                     FROM transactions t JOIN (
+                         SELECT username, COALESCE(category, '') AS category, AVG(amount) AS mean FROM transactions
+                         WHERE type = 'expense' {where.replace('t.', '')} GROUP BY 1, 2
+                     ) a ON a.username = t.username AND a.category = COALESCE(t.category, '')
+                     WHERE t.type = 'expense' {where}
+                     GROUP BY 1, 2''', params * 2)
+
+# --- Analytics Versions ---
+# Per (user, year) counter bumped by every write to that year's transactions, so the columnar
+# analytics store (analytics.py) knows which year partitions to re-export, whichever process wrote.
+def _analytics_bump_sql(row):
+    year = ROLLUP_PERIODS['year'].format(d=f'{row}.date')
+    return f'''
+            INSERT INTO analytics_versions (username, year, version) VALUES ({row}.username, COALESCE({year}, ''), 1)
+            ON CONFLICT (username, year) DO UPDATE SET version = version + 1;'''
+
+def _create_analytics_triggers(conn):
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_analytics_insert
+        AFTER INSERT ON transactions BEGIN{_analytics_bump_sql('NEW')}
+        END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_analytics_delete
+        AFTER DELETE ON transactions BEGIN{_analytics_bump_sql('OLD')}
+        END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_analytics_update
+        AFTER UPDATE OF username, date, type, category, amount ON transactions BEGIN{_analytics_bump_sql('OLD')}{_analytics_bump_sql('NEW')}
+        END''')
+
+# --- Schema Migrations ---
+# Ordered (version, statements) pairs. A statement is either SQL or a callable taking the connection.
+# The applied version is stored in PRAGMA user_version; never edit a migration once released.
+MIGRATIONS = [
+    (1, [
+        '''CREATE TABLE IF NOT EXISTS users (
             username TEXT PRIMARY KEY,
             password TEXT
-        )''')
-        c.execute('''CREATE TABLE IF NOT EXISTS transactions (
+        )''',
+        '''CREATE TABLE IF NOT EXISTS transactions (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT,
             date TEXT,
@@ -28,11 +220,144 @@ def init_db():
             category TEXT,
             amount REAL,
             description TEXT
-        )''')
-        c.execute('''CREATE TABLE IF NOT EXISTS budgets (
+        )''',
+        '''CREATE TABLE IF NOT EXISTS budgets (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT,
             category TEXT,
             budget_amount REAL
-        )''')
-        conn.commit() 
\ No newline at end of file
+        )''',
+    ]),
+    (2, [
+        'CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions (username, date)',
+        'CREATE INDEX IF NOT EXISTS idx_transactions_user_type_category ON transactions (username, type, category, amount)',
+        # Keep only the newest budget per user/category before enforcing uniqueness
+        '''DELETE FROM budgets WHERE id NOT IN (
+            SELECT MAX(id) FROM budgets GROUP BY username, category
+        )''',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_budgets_user_category ON budgets (username, category)',
+    ]),
+    (3, [
+        'ALTER TABLE transactions ADD COLUMN content_hash TEXT',
+        _backfill_transaction_hashes,
+        'CREATE INDEX IF NOT EXISTS idx_transactions_user_hash ON transactions (username, content_hash)',
+    ]),
+    (4, [
+        '''CREATE TABLE IF NOT EXISTS rollups (
+            username TEXT NOT NULL,
+            granularity TEXT NOT NULL,
+            period TEXT NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, granularity, period, type, category)
+        ) WITHOUT ROWID''',
+        _create_rollup_triggers,
+        rebuild_rollups,
+    ]),
+    (5, [
+        '''CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            group_key TEXT NOT NULL,
+            dedupe_key TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            progress REAL NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            started_at TEXT,
+            finished_at TEXT
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs (dedupe_key, status)',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_user_group ON jobs (username, kind, group_key, status, finished_at)',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)',
+    ]),
+    (6, [
+        '''CREATE TABLE IF NOT EXISTS expense_stats (
+            username TEXT NOT NULL,
+            category TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            mean REAL NOT NULL DEFAULT 0,
+            m2 REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, category)
+        ) WITHOUT ROWID''',
+        _create_expense_stats_triggers,
+        rebuild_expense_stats,
+    ]),
+    (7, [
+        # 'all' (lifetime spend), 'year', 'month' or 'week'
+        "ALTER TABLE budgets ADD COLUMN period TEXT NOT NULL DEFAULT 'all'",
+    ]),
+    (8, [
+        '''CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            category TEXT NOT NULL DEFAULT '',
+            period TEXT NOT NULL DEFAULT '',
+            message TEXT NOT NULL,
+            read INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )''',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_notifications_key ON notifications (username, kind, category, period)',
+        'CREATE INDEX IF NOT EXISTS idx_notifications_user_recent ON notifications (username, updated_at, id)',
+    ]),
+    (9, [
+        # Bumped on logout to revoke the user's session tokens
+        'ALTER TABLE users ADD COLUMN session_epoch INTEGER NOT NULL DEFAULT 0',
+        '''CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )''',
+    ]),
+    (10, [
+        '''CREATE TABLE IF NOT EXISTS analytics_versions (
+            username TEXT NOT NULL,
+            year TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, year)
+        ) WITHOUT ROWID''',
+        _create_analytics_triggers,
+        f'''INSERT OR IGNORE INTO analytics_versions (username, year, version)
+            SELECT username, COALESCE({ROLLUP_PERIODS['year'].format(d='date')}, ''), 1 FROM transactions GROUP BY 1, 2''',
+    ]),
+    (11, [
+        # Process running the job and its last heartbeat, so only jobs of a vanished process are requeued
+        'ALTER TABLE jobs ADD COLUMN worker TEXT',
+        'ALTER TABLE jobs ADD COLUMN heartbeat_at TEXT',
+    ]),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn):
+    for version, statements in MIGRATIONS:
+        if get_schema_version(conn) >= version:
+            continue
+        # BEGIN IMMEDIATE serializes concurrent startups; re-check the version once we hold the lock.
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+def init_db():
+    with get_connection() as conn:
+        migrate(conn)
@@ -0,0 +1,100 @@
+import csv
+import io
+import zlib
+from db import get_connection
+from transactions import transaction_filters, TRANSACTION_COLUMNS
+
+# --- Streaming CSV Export ---
+EXPORT_CHUNK_SIZE = 5000
+
+class _CsvChunk:
+    # Minimal file-like target so csv.writer output can be handed out chunk by chunk
+    def __init__(self):
+        self.parts = []
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def drain(self):
+        text = ''.join(self.parts)
+        self.parts = []
+        return text
+
+def _iter_csv(header, cursor, chunk_size):
+    buffer = _CsvChunk()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield buffer.drain()
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        writer.writerows(rows)
+        yield buffer.drain()
+
+def _encode(chunks, gzip=False):
+    if not gzip:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def iter_transactions_csv(username, type=None, category=None, start_date=None, end_date=None,
+                          gzip=False, chunk_size=EXPORT_CHUNK_SIZE):
+    # Yields the user's (optionally filtered) history as CSV bytes, oldest first, chunk_size rows at a time
+    clauses, params = transaction_filters(username, type, category, start_date, end_date)
+    with get_connection() as conn:
+        cursor = conn.execute(f'''SELECT {", ".join(TRANSACTION_COLUMNS)} FROM transactions
+                                  WHERE {" AND ".join(clauses)} ORDER BY date, id''', params)
+        try:
+            yield from _encode(_iter_csv(TRANSACTION_COLUMNS, cursor, chunk_size), gzip)
+        finally:
+            cursor.close()
+
+class _RowSource:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchmany(self, size):
+        return [row for _, row in zip(range(size), self.rows)]
+
+def iter_tax_report_csv(username, year, deductible_categories=(), gzip=False, chunk_size=EXPORT_CHUNK_SIZE):
+    # Per (type, category) totals for one year, read from the yearly rollups
+    deductible = set(deductible_categories)
+    with get_connection() as conn:
+        cursor = conn.execute('''SELECT type, category, total FROM rollups
+                                 WHERE username = ? AND granularity = 'year' AND period = ?
+                                 ORDER BY type, category''', (username, str(year)))
+        rows = ((t, c, total, '✅' if c in deductible else '') for t, c, total in cursor)
+        try:
+            yield from _encode(_iter_csv(['type', 'category', 'amount', 'Deductible'], _RowSource(rows), chunk_size), gzip)
+        finally:
+            cursor.close()
+
+class _GeneratorReader(io.RawIOBase):
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            try:
+                self.pending = next(self.chunks)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+def as_file(chunks):
+    # Wraps a bytes generator in a read-only file object, e.g. for st.download_button
+    return io.BufferedReader(_GeneratorReader(chunks))
@@ -0,0 +1,98 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from db import get_connection
+from cache import data_version, changed_since, FULL_CHANGE
+from ml_model import calendar_features, LAG_DAYS
+
+# --- Feature Store ---
+# Per-user daily expense totals with the calendar and lag features of ml_model.preprocess_data.
+# Daily totals come from the day rollups; when the user's data changes only the days from the
+# start of the earliest changed year onward are re-read and re-featurized. Changed years are found
+# from the per-year analytics versions, so writes made by other processes are picked up too.
+FEATURE_STORE_MAX_USERS = 256
+CALENDAR_COLUMNS = ['year', 'month', 'day', 'day_of_week', 'day_of_year',
+                    'is_first_of_month', 'is_second_of_month', 'is_fifth_of_month', 'is_monday']
+LAG_COLUMNS = [f'lag_{i}' for i in range(1, LAG_DAYS + 1)]
+FEATURE_COLUMNS = ['date', 'daily_expense'] + CALENDAR_COLUMNS + LAG_COLUMNS
+
+_store = OrderedDict()  # username -> (data version, year versions, full daily frame incl. rows without complete lags)
+_lock = threading.Lock()
+_stats = {'full_builds': 0, 'incremental_updates': 0, 'hits': 0}
+
+def _daily_expenses(username, since=FULL_CHANGE):
+    with get_connection() as conn:
+        rows = conn.execute('''SELECT period, SUM(total) FROM rollups
+                               WHERE username = ? AND granularity = 'day' AND type = 'expense' AND period >= ?
+                               GROUP BY period ORDER BY period''', (username, since)).fetchall()
+    dates = pd.to_datetime(pd.Series([r[0] for r in rows], dtype=object), format='%Y-%m-%d', errors='coerce')
+    totals = np.asarray([r[1] for r in rows], dtype='float64')
+    valid = dates.notna().to_numpy()
+    return pd.DatetimeIndex(dates[valid]), totals[valid]
+
+def _featurize(dates, totals, previous_totals):
+    # previous_totals: daily totals of the days just before `dates` (oldest first), used to seed the lags
+    frame = pd.DataFrame({'date': dates, 'daily_expense': totals})
+    for column, values in calendar_features(dates).items():
+        frame[column] = values
+    series = np.concatenate([previous_totals, totals])
+    offset = len(previous_totals)
+    for i in range(1, LAG_DAYS + 1):
+        lagged = np.full(len(totals), np.nan)
+        start = max(0, i - offset)
+        lagged[start:] = series[offset - i + start: offset - i + len(totals)]
+        frame[f'lag_{i}'] = lagged
+    return frame[FEATURE_COLUMNS]
+
+def _year_versions(username):
+    with get_connection() as conn:
+        return dict(conn.execute("SELECT year, version FROM analytics_versions WHERE username = ? AND year != ''",
+                                 (username,)).fetchall())
+
+def _changed_from(username, cached_version, cached_years, years):
+    # Start of the earliest changed year, FULL_CHANGE if unknown, or None if nothing changed
+    if changed_since(username, cached_version) == FULL_CHANGE:
+        return FULL_CHANGE
+    stale = [year for year in years.keys() | cached_years.keys() if years.get(year) != cached_years.get(year)]
+    return f"{min(stale)}-01-01" if stale else None
+
+def _refresh(username, cached):
+    version = data_version(username)
+    years = _year_versions(username)
+    if cached is not None:
+        cached_version, cached_years, frame = cached
+        since = _changed_from(username, cached_version, cached_years, years)
+        if since is None:
+            return version, years, frame, 'hit'
+        if since != FULL_CHANGE:
+            kept = frame[frame['date'] < pd.Timestamp(since)]
+            dates, totals = _daily_expenses(username, since)
+            previous = kept['daily_expense'].to_numpy()[-LAG_DAYS:]
+            fresh = _featurize(dates, totals, previous)
+            frame = pd.concat([kept, fresh], ignore_index=True) if len(kept) else fresh
+            return version, years, frame, 'incremental'
+    dates, totals = _daily_expenses(username)
+    return version, years, _featurize(dates, totals, np.empty(0)), 'full'
+
+def load_features(username):
+    # Equivalent of ml_model.preprocess_data(expense transactions) for a user; treat as read-only
+    with _lock:
+        cached = _store.get(username)
+    version, years, frame, outcome = _refresh(username, cached)
+    with _lock:
+        _store[username] = (version, years, frame)
+        _store.move_to_end(username)
+        while len(_store) > FEATURE_STORE_MAX_USERS:
+            _store.popitem(last=False)
+        if outcome == 'hit':
+            _stats['hits'] += 1
+        elif outcome == 'incremental':
+            _stats['incremental_updates'] += 1
+        else:
+            _stats['full_builds'] += 1
+    return frame.iloc[LAG_DAYS:]
+
+def feature_store_stats():
+    with _lock:
+        return {'users': len(_store), **_stats}
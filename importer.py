@@ -0,0 +1,166 @@
+import csv
+import io
+import os
+import re
+from datetime import datetime
+from transactions import save_transactions_bulk, DATE_FORMAT, DUPLICATE_MESSAGE
+
+# --- Bank Statement Import ---
+CHUNK_SIZE = 1000
+DEFAULT_CATEGORY = "Other"
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y", "%Y/%m/%d", "%d.%m.%Y", "%d %b %Y", "%d-%b-%Y", "%Y%m%d"]
+
+# Header names (lower-cased) recognised for each transactions column
+COLUMN_ALIASES = {
+    'date': ['date', 'transaction date', 'txn date', 'posting date', 'posted date', 'value date'],
+    'type': ['type', 'transaction type'],
+    'category': ['category'],
+    'amount': ['amount', 'transaction amount', 'amount (inr)', 'amt'],
+    'debit': ['debit', 'debit amount', 'withdrawal', 'withdrawals', 'withdrawal amt.', 'dr'],
+    'credit': ['credit', 'credit amount', 'deposit', 'deposits', 'deposit amt.', 'cr'],
+    'description': ['description', 'narration', 'details', 'memo', 'payee', 'particulars', 'remarks'],
+}
+
+def parse_date(value):
+    value = (value or '').strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime(DATE_FORMAT)
+        except ValueError:
+            continue
+    return None
+
+# Currency markers stripped before parsing ("Rs. 1,234.00", "INR 500", "₹500")
+_CURRENCY = re.compile(r'(?:rs\.?|inr|usd|eur|gbp|[₹$€£])\s*', re.IGNORECASE)
+# Trailing debit/credit markers on a single amount column ("500 Dr", "1,200.00 CR")
+_DEBIT_CREDIT_SUFFIX = re.compile(r'\s*(?<![a-z])(dr|cr)\.?$', re.IGNORECASE)
+
+def parse_amount(value):
+    # Signed float (debits negative) or None
+    value = (value or '').strip()
+    if not value:
+        return None
+    negative = value.startswith('(') and value.endswith(')')
+    if negative:
+        value = value[1:-1].strip()
+    suffix = _DEBIT_CREDIT_SUFFIX.search(value)
+    if suffix:
+        negative = negative or suffix.group(1).lower() == 'dr'
+        value = value[:suffix.start()]
+    cleaned = re.sub(r'[^0-9.\-]', '', _CURRENCY.sub('', value))
+    try:
+        amount = float(cleaned)
+    except ValueError:
+        return None
+    return -abs(amount) if negative else amount
+
+def detect_columns(header):
+    lowered = [h.strip().lower() for h in header]
+    mapping = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in lowered:
+                mapping[column] = header[lowered.index(alias)]
+                break
+    return mapping
+
+def _to_transaction(date, amount, description, type=None, category=None):
+    # Signed amounts decide the type when the statement doesn't carry one
+    date = parse_date(date)
+    if date is None or amount is None or amount == 0:
+        return None
+    if type:
+        type = type.strip().lower()
+        if type in ('debit', 'dr'):
+            type = 'expense'
+        elif type in ('credit', 'cr'):
+            type = 'income'
+    if type not in ('income', 'expense'):
+        type = 'income' if amount > 0 else 'expense'
+    return {
+        'date': date,
+        'type': type,
+        'category': (category or '').strip() or DEFAULT_CATEGORY,
+        'amount': abs(amount),
+        'description': (description or '').strip(),
+    }
+
+def iter_csv_rows(stream, mapping=None):
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None:
+        return
+    mapping = mapping or detect_columns(reader.fieldnames)
+    if 'date' not in mapping or not ({'amount', 'debit', 'credit'} & mapping.keys()):
+        raise ValueError("Could not find date and amount columns in the CSV header.")
+    for record in reader:
+        get = lambda column: record.get(mapping[column]) if column in mapping else None
+        if 'amount' in mapping:
+            amount = parse_amount(get('amount'))
+        else:
+            debit = parse_amount(get('debit')) or 0
+            credit = parse_amount(get('credit')) or 0
+            amount = credit - abs(debit) if (debit or credit) else None
+        yield _to_transaction(get('date'), amount, get('description'), get('type'), get('category'))
+
+_OFX_TAG = re.compile(r'<(/?)([A-Z0-9.]+)>([^<\r\n]*)', re.IGNORECASE)
+
+def iter_ofx_rows(stream):
+    # OFX 1.x (SGML) and 2.x (XML) both keep one field per tag; only STMTTRN blocks are buffered
+    current = None
+    for line in stream:
+        for closing, tag, value in _OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and current is not None:
+                    yield _to_transaction((current.get('DTPOSTED') or '')[:8], parse_amount(current.get('TRNAMT')),
+                                          current.get('NAME') or current.get('MEMO'))
+                    current = None
+                elif not closing:
+                    current = {}
+            elif current is not None and not closing and value.strip():
+                current[tag] = value.strip()
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _text_stream(file):
+    if isinstance(file, (str, os.PathLike)):
+        return open(file, 'r', encoding='utf-8-sig', newline='')
+    if isinstance(file, io.TextIOBase):
+        return file
+    return io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+
+def import_statement(username, file, format=None, mapping=None, chunk_size=CHUNK_SIZE):
+    # file: path or file-like object (text or binary); format: 'csv' or 'ofx', guessed from the name if omitted.
+    # Returns a summary dict with imported / duplicates / invalid counts.
+    if format is None:
+        name = file if isinstance(file, (str, os.PathLike)) else getattr(file, 'name', '')
+        format = 'ofx' if str(name).lower().endswith(('.ofx', '.qfx')) else 'csv'
+    stream = _text_stream(file)
+    summary = {'imported': 0, 'duplicates': 0, 'invalid': 0}
+    dedupe_state = {}
+    try:
+        rows = iter_ofx_rows(stream) if format == 'ofx' else iter_csv_rows(stream, mapping)
+        for chunk in _chunks(rows, chunk_size):
+            valid = [row for row in chunk if row is not None]
+            summary['invalid'] += len(chunk) - len(valid)
+            for success, msg in save_transactions_bulk(username, valid, skip_duplicates=True, dedupe_state=dedupe_state):
+                if success:
+                    summary['imported'] += 1
+                elif msg == DUPLICATE_MESSAGE:
+                    summary['duplicates'] += 1
+                else:
+                    summary['invalid'] += 1
+    finally:
+        if isinstance(file, (str, os.PathLike)):
+            stream.close()
+        elif stream is not file:
+            stream.detach()
+    return summary
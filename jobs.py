@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from db import get_connection
+
+# --- Background Jobs ---
+# Training/forecast work runs on a local worker pool; the jobs table records status, progress
+# and results so any rerun (or another session) can pick them up without waiting.
+JOB_WORKERS = 3  # one per selectable model, so a Forecast page run never queues behind itself
+JOB_HISTORY_LIMIT = 50  # finished jobs kept per user
+JOB_KINDS = ('train', 'forecast')
+ACTIVE_STATUSES = ('pending', 'running')
+# Unique expense days a forecast needs: ml_model.MIN_TRAINING_ROWS plus the LAG_DAYS dropped for lags
+# (kept here so pages can check it without importing the ML stack)
+MIN_FORECAST_DAYS = 17
+# Each process beats for the jobs it runs; a running job whose worker stopped beating is queued again
+JOB_HEARTBEAT = 30
+JOB_STALE_AFTER = 5 * 60
+WORKER_ID = f"{os.getpid()}-{secrets.token_hex(6)}"
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_resume_lock = threading.Lock()
+_resumed = False
+_heartbeat = None
+
+def data_signature(username):
+    # Changes whenever the user's transactions change: the analytics versions only ever grow,
+    # so an edit that is later undone still yields a new signature
+    with get_connection() as conn:
+        version = conn.execute('SELECT COALESCE(SUM(version), 0) FROM analytics_versions WHERE username = ?',
+                               (username,)).fetchone()[0]
+    return str(version)
+
+def _key(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    keys = ['id', 'username', 'kind', 'params', 'status', 'progress', 'result', 'error', 'created_at', 'started_at', 'finished_at']
+    job = dict(zip(keys, row))
+    job['params'] = json.loads(job['params'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+_JOB_COLUMNS = 'id, username, kind, params, status, progress, result, error, created_at, started_at, finished_at'
+
+def submit_job(username, kind, params, group=None):
+    # Returns the id of a job for (username, kind, params) on the user's current data.
+    # An identical pending, running, finished or failed job is reused instead of queueing a new one
+    # (a failed job is retried once the user's data changes).
+    # group (a subset of params, default all of them) is what latest_finished_job matches on.
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    _resume_pending_jobs()
+    group_key = _key(username, kind, params if group is None else group)
+    dedupe_key = _key(username, kind, params, data_signature(username))
+    with get_connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute('''SELECT id FROM jobs WHERE dedupe_key = ? AND status IN ('pending', 'running', 'done', 'failed')
+                              ORDER BY id DESC LIMIT 1''', (dedupe_key,)).fetchone()
+        if row:
+            return row[0]
+        c = conn.execute('''INSERT INTO jobs (username, kind, params, group_key, dedupe_key)
+                             VALUES (?, ?, ?, ?, ?)''',
+                         (username, kind, json.dumps(params, sort_keys=True), group_key, dedupe_key))
+        job_id = c.lastrowid
+        conn.execute('''DELETE FROM jobs WHERE username = ? AND status IN ('done', 'failed') AND id NOT IN (
+                            SELECT id FROM jobs WHERE username = ? AND status IN ('done', 'failed')
+                            ORDER BY id DESC LIMIT ?)''', (username, username, JOB_HISTORY_LIMIT))
+    _executor.submit(_run_job, job_id)
+    return job_id
+
+def get_job(job_id):
+    with get_connection() as conn:
+        row = conn.execute(f'SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    return _row_to_job(row)
+
+def latest_finished_job(username, kind, group):
+    # Most recent successful job in the same group, on any version of the data
+    with get_connection() as conn:
+        row = conn.execute(f'''SELECT {_JOB_COLUMNS} FROM jobs
+                               WHERE username = ? AND kind = ? AND group_key = ? AND status = 'done'
+                               ORDER BY finished_at DESC, id DESC LIMIT 1''',
+                           (username, kind, _key(username, kind, group))).fetchone()
+    return _row_to_job(row)
+
+def _update_job(job_id, **fields):
+    assignments = ', '.join(f"{name} = ?" for name in fields)
+    with get_connection() as conn:
+        conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+
+def _resume_pending_jobs():
+    # Jobs left pending by a previous process are queued again once per process. Running jobs are left
+    # to the process running them (e.g. the API server next to the app) while its heartbeat is fresh.
+    global _resumed
+    with _resume_lock:
+        first = not _resumed
+        _resumed = True
+    with get_connection() as conn:
+        job_ids = [row[0] for row in conn.execute('''UPDATE jobs SET status = 'pending', progress = 0
+                                                      WHERE status = 'running' AND worker IS NOT ?
+                                                      AND COALESCE(heartbeat_at, started_at) < datetime('now', ?)
+                                                      RETURNING id''', (WORKER_ID, f'-{JOB_STALE_AFTER} seconds')).fetchall()]
+        if first:
+            job_ids = [row[0] for row in conn.execute("SELECT id FROM jobs WHERE status = 'pending' ORDER BY id")]
+    for job_id in job_ids:
+        _executor.submit(_run_job, job_id)
+
+def _beat():
+    while True:
+        try:
+            with get_connection() as conn:
+                conn.execute("UPDATE jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE worker = ? AND status = 'running'", (WORKER_ID,))
+        except sqlite3.Error:
+            pass  # e.g. database locked; the next beat is well within JOB_STALE_AFTER
+        time.sleep(JOB_HEARTBEAT)
+
+def _start_heartbeat():
+    global _heartbeat
+    with _resume_lock:
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_beat, name="job-heartbeat", daemon=True)
+            _heartbeat.start()
+
+def _run_job(job_id):
+    _start_heartbeat()
+    with get_connection() as conn:
+        claimed = conn.execute('''UPDATE jobs SET status = 'running', started_at = CURRENT_TIMESTAMP,
+                                  heartbeat_at = CURRENT_TIMESTAMP, worker = ?, progress = 0.05
+                                  WHERE id = ? AND status = 'pending' ''', (WORKER_ID, job_id)).rowcount
+    if not claimed:
+        return
+    job = get_job(job_id)
+    try:
+        result = _JOB_HANDLERS[job['kind']](job, lambda progress: _update_job(job_id, progress=progress))
+        _update_job(job_id, status='done', progress=1.0, result=json.dumps(result), finished_at=_now())
+    except Exception as e:
+        _update_job(job_id, status='failed', error=str(e), finished_at=_now())
+
+def _now():
+    # Same format as SQLite's CURRENT_TIMESTAMP (UTC)
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+# --- Job Handlers ---
+def _train_job(job, report):
+    from feature_store import load_features
+    from training import train_models_parallel, jobs_per_model, PARALLEL_MODELS
+    params = job['params']
+    features_df = load_features(job['username'])
+    report(0.2)
+    model_params = dict(params.get('model_params') or {})
+    if params['model_type'] in PARALLEL_MODELS:
+        # Concurrent jobs share the cores
+        model_params.setdefault('n_jobs', jobs_per_model(JOB_WORKERS))
+    model_type, (model, scaler, metrics, features), seconds = next(
+        train_models_parallel(job['username'], None, [params['model_type']], {params['model_type']: model_params}))
+    if model is None:
+        raise RuntimeError(metrics)
+    return {'model_type': model_type, 'metrics': list(metrics), 'features': features, 'seconds': seconds}, (model, scaler, features_df)
+
+def _forecast_job(job, report):
+    from ml_model import predict_future_expenses
+    params = job['params']
+    trained, (model, scaler, features_df) = _train_job(job, report)
+    report(0.8)
+    forecast_df, error = predict_future_expenses(model, scaler, None, num_days=int(params.get('num_days', 30)),
+                                                 features=trained['features'], mode=params.get('mode', 'recursive'),
+                                                 preprocessed_df=features_df)
+    if forecast_df is None:
+        raise RuntimeError(error)
+    return {
+        **trained,
+        'forecast': {
+            'date': forecast_df['date'].dt.strftime('%Y-%m-%d').tolist(),
+            'predicted_expense': forecast_df['predicted_expense'].tolist(),
+        },
+    }
+
+_JOB_HANDLERS = {
+    'train': lambda job, report: _train_job(job, report)[0],
+    'forecast': _forecast_job,
+}
+
+def forecast_frame(job):
+    # DataFrame view of a finished forecast job's result
+    forecast = job['result']['forecast']
+    return pd.DataFrame({'date': pd.to_datetime(forecast['date']), 'predicted_expense': forecast['predicted_expense']})
@@ -0,0 +1,60 @@
+import importlib
+import json
+import os
+import sys
+import threading
+from functools import lru_cache
+
+# --- Lazy Imports ---
+# Heavy modules (plotly, the ML stack) are imported on first use instead of at app start, so pages
+# that never touch them don't pay for them.
+class LazyModule:
+    # Stand-in for a module that is imported on first attribute access
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+def lazy_import(name):
+    return LazyModule(name)
+
+def lazy_function(module, name):
+    # Callable that imports `module` on its first call and forwards to module.name
+    lazy = LazyModule(module)
+    def call(*args, **kwargs):
+        return getattr(lazy, name)(*args, **kwargs)
+    call.__name__ = name
+    return call
+
+def prefetch(*names):
+    # Imports modules on a background thread (e.g. when a page that will need them opens)
+    names = [name for name in names if name not in sys.modules]
+    if not names:
+        return
+    def load():
+        for name in names:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass
+    threading.Thread(target=load, name="prefetch", daemon=True).start()
+
+# --- Static Assets ---
+ASSETS_DIR = os.path.join(os.path.dirname(__file__), 'assets')
+
+@lru_cache(maxsize=None)
+def load_lottie(name):
+    # Parsed once per process from assets/lottie/<name>.json; treat as read-only
+    with open(os.path.join(ASSETS_DIR, 'lottie', f'{name}.json'), encoding='utf-8') as f:
+        return json.load(f)
@@ -2,15 +2,24 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from streamlit_option_menu import option_menu
-from streamlit_lottie import st_lottie
-import plotly.express as px
-import plotly.graph_objects as go
+from lazy import lazy_import, lazy_function, prefetch, load_lottie
+px = lazy_import("plotly.express")
+go = lazy_import("plotly.graph_objects")
+analytics = lazy_import("analytics")
+st_lottie = lazy_function("streamlit_lottie", "st_lottie")
 
-from auth import load_users, add_user, verify_user
-from transactions import load_transactions, save_transaction, load_budgets, save_budget, delete_all_transactions
-from ml_model import preprocess_data, train_model, predict_future_expenses
+from auth import add_user, verify_user, login, issue_session_token, verify_session_token, revoke_sessions
+from transactions import transaction_view, save_transaction, save_budget, delete_all_transactions
+from transactions import category_budget_status, BUDGET_PERIODS
+from transactions import query_transactions, load_categories, HISTORY_PAGE_SIZE
+from jobs import submit_job, get_job, latest_finished_job, forecast_frame, MIN_FORECAST_DAYS
+from rollups import load_category_totals
+from export import iter_transactions_csv, iter_tax_report_csv, as_file
+from anomalies import find_anomalies, find_rolling_anomalies, is_anomalous
+from charts import income_expense_series, downsample, chart_mode, CHART_RANGES, RESOLUTION_LABELS
+from notifications import notify, list_notifications, unread_count, mark_read, check_budget, check_budgets, NOTIFICATIONS_PAGE_SIZE
 from styles import CUSTOM_CSS
-from db import init_db, get_connection
+from db import init_db
 init_db()
 
 # --- Configuration Constants ---
@@ -29,69 +38,10 @@ INCOME_CATEGORIES = [
 ]
 DATE_FORMAT = "%Y-%m-%d"
 
-# --- Lottie Animations (Embedded JSON Data) ---
-LOTTIE_FINANCIAL_GROWTH = {
-    "v": "5.7.4", "fr": 60, "ip": 0, "op": 120, "w": 500, "h": 500, "nm": "Financial Growth",
-    "ddd": 0, "assets": [], "layers": [
-        {"ddd": 0, "ind": 0, "ty": 4, "nm": "Graph", "sr": 1, "ks": {
-            "o": {"a": 0, "k": 100, "ix": 1},
-            "r": {"a": 0, "k": 0, "ix": 2},
-            "p": {"a": 0, "k": [250, 250, 0], "ix": 3},
-            "a": {"a": 0, "k": [250, 250, 0], "ix": 4},
-            "s": {"a": 0, "k": [100, 100, 100], "ix": 5}
-        }, "ao": 0, "shapes": [
-            {"ty": "gr", "it": [
-                {"ind": 0, "ty": "sh", "ix": 1, "ks": {
-                    "a": 0, "k": {
-                        "i": [[0.833, 0.833], [0.833, 0.833], [0.833, 0.833], [0.833, 0.833]],
-                        "o": [[0.167, 0.167], [0.167, 0.167], [0.167, 0.167], [0.167, 0.167]],
-                        "v": [[100, 400], [200, 200], [300, 300], [400, 100]],
-                        "c": False
-                    }, "ix": 2
-                }, "nm": "Path 1", "mn": "ADBE Vector Shape - Group", "hd": False},
-                {"ty": "st", "c": {"a": 0, "k": [0.298, 0.686, 0.314, 1], "ix": 3},
-                 "o": {"a": 0, "k": 100, "ix": 4}, "lw": {"a": 0, "k": 10, "ix": 5},
-                 "lc": 1, "lj": 1, "ml": 4, "mn": "ADBE Vector Stroke", "hd": False},
-                {"ty": "fl", "c": {"a": 0, "k": [0.298, 0.686, 0.314, 0.5], "ix": 6},
-                 "o": {"a": 0, "k": 100, "ix": 7}, "r": 1, "mn": "ADBE Vector Fill", "hd": False}
-            ], "nm": "Group 1", "np": 3, "cix": 2, "ix": 1, "mn": "ADBE Vector Group", "hd": False}
-        ], "ef": [], "ip": 0, "op": 120, "st": 0, "bm": 0}
-    ], "markers": []
-}
-
-LOTTIE_DATA_ANALYSIS = {
-    "v": "5.7.4", "fr": 60, "ip": 0, "op": 120, "w": 500, "h": 500, "nm": "Data Analysis",
-    "ddd": 0, "assets": [], "layers": [
-        {"ddd": 0, "ind": 0, "ty": 4, "nm": "Chart", "sr": 1, "ks": {"o": {"a": 0, "k": 100, "ix": 1}, "r": {"a": 0, "k": 0, "ix": 2}, "p": {"a": 0, "k": [250, 250, 0], "ix": 3}, "a": {"a": 0, "k": [250, 250, 0], "ix": 4}, "s": {"a": 0, "k": [100, 100, 100], "ix": 5}}, "ao": 0, "shapes": [
-            {"ty": "gr", "it": [
-                {"ind": 0, "ty": "rc", "d": 1, "s": {"a": 0, "k": [50, 150], "ix": 2}, "p": {"a": 0, "k": [150, 350], "ix": 3}, "r": {"a": 0, "k": 5, "ix": 4}, "mn": "ADBE Vector Shape - Rect", "hd": False},
-                {"ty": "fl", "c": {"a": 0, "k": [0.2, 0.6, 0.8, 1], "ix": 5}, "o": {"a": 0, "k": 100, "ix": 6}, "r": 1, "mn": "ADBE Vector Fill", "hd": False}
-            ], "nm": "Bar 1", "np": 2, "cix": 2, "ix": 1, "mn": "ADBE Vector Group", "hd": False},
-            {"ty": "gr", "it": [
-                {"ind": 0, "ty": "rc", "d": 1, "s": {"a": 0, "k": [50, 100], "ix": 2}, "p": {"a": 0, "k": [250, 400], "ix": 3}, "r": {"a": 0, "k": 5, "ix": 4}, "mn": "ADBE Vector Shape - Rect", "hd": False},
-                {"ty": "fl", "c": {"a": 0, "k": [0.2, 0.6, 0.8, 1], "ix": 5}, "o": {"a": 0, "k": 100, "ix": 6}, "r": 1, "mn": "ADBE Vector Fill", "hd": False}
-            ], "nm": "Bar 2", "np": 2, "cix": 2, "ix": 2, "mn": "ADBE Vector Group", "hd": False}
-        ], "ip": 0, "op": 120, "st": 0, "bm": 0}
-    ], "markers": []
-}
-
-LOTTIE_FORECAST = {
-    "v": "5.7.4", "fr": 60, "ip": 0, "op": 120, "w": 500, "h": 500, "nm": "Forecast",
-    "ddd": 0, "assets": [], "layers": [
-        {"ddd": 0, "ind": 0, "ty": 4, "nm": "Forecast", "sr": 1, "ks": {
-            "o": {"a": 0, "k": 100, "ix": 1},
-            "r": {"a": 0, "k": 0, "ix": 2},
-            "p": {"a": 0, "k": [250, 250, 0], "ix": 3},
-            "a": {"a": 0, "k": [250, 250, 0], "ix": 4},
-            "s": {"a": 0, "k": [100, 100, 100], "ix": 5}
-        }, "ao": 0, "shapes": [
-            {"ty": "gr", "it": [
-                {"ind": 0, "ty": "el", "p": {"a": 0, "k": [250, 250], "ix": 3}, "s": {"a": 0, "k": [200, 200], "ix": 2}, "d": 1, "mn": "ADBE Vector Shape - Ellipse", "hd": False},
-                {"ty": "fl", "c": {"a": 0, "k": [0.9, 0.7, 0.2, 1], "ix": 4}, "o": {"a": 0, "k": 100, "ix": 5}, "r": 1, "mn": "ADBE Vector Fill", "hd": False}
-            ], "nm": "Ellipse 1", "np": 2, "cix": 2, "ix": 1, "mn": "ADBE Vector Group", "hd": False}
-        ], "ip": 0, "op": 120, "st": 0, "bm": 0}
-    ], "markers": []
-}
+# --- Lottie Animations (assets/lottie/*.json, parsed once per process) ---
+LOTTIE_FINANCIAL_GROWTH = load_lottie("financial_growth")
+LOTTIE_DATA_ANALYSIS = load_lottie("data_analysis")
+LOTTIE_FORECAST = load_lottie("forecast")
 
 st.set_page_config(
     page_title="SmartFinTrack – ML-Powered Personal Finance Tracker",
@@ -106,8 +56,15 @@ if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
     st.session_state.username = None
     st.session_state.current_page = "Dashboard"
-if 'alerts' not in st.session_state:
-    st.session_state.alerts = []
+    # A signed session token in the URL restores the login on reloads and reconnects without bcrypt
+    token = st.query_params.get("session")
+    if token:
+        token_user = verify_session_token(token)
+        if token_user:
+            st.session_state.logged_in = True
+            st.session_state.username = token_user
+        else:
+            del st.query_params["session"]
 
 # --- User Authentication ---
 def show_login_signup():
@@ -127,13 +84,16 @@ def show_login_signup():
         if login_button:
             if not username or not password:
                 st.error("Please enter both username and password.")
-            elif verify_user(username, password):
-                st.session_state.logged_in = True
-                st.session_state.username = username
-                st.success(f"Welcome back, {username}! 🎉")
-                st.rerun()
             else:
-                st.error("Invalid username or password.")
+                success, msg = login(username, password)
+                if success:
+                    st.session_state.logged_in = True
+                    st.session_state.username = username
+                    st.query_params["session"] = issue_session_token(username)
+                    st.success(f"Welcome back, {username}! 🎉")
+                    st.rerun()
+                else:
+                    st.error(msg)
     else:
         st.subheader("Sign Up")
         new_username = st.text_input("New Username", key="signup_username")
@@ -172,10 +132,12 @@ else:
         )
         st.markdown("---")
         if st.button("Logout"):
+            revoke_sessions(st.session_state.username)
+            st.query_params.pop("session", None)
             st.session_state.logged_in = False
             st.session_state.username = None
             st.session_state.current_page = "Dashboard"
-            st.session_state.alerts = []
+            st.session_state.notifications_page = 0
             st.rerun()
 
     # --- Settings Page ---
@@ -188,7 +150,6 @@ else:
             password = st.text_input("Enter your password to confirm:", type="password")
             col1, col2 = st.columns(2)
             if col1.button("Confirm Reset"):
-                from auth import verify_user
                 if verify_user(st.session_state.username, password):
                     from transactions import delete_all_transactions
                     delete_all_transactions(st.session_state.username)
@@ -207,20 +168,35 @@ else:
     # --- Dashboard Page ---
     if selected == "Dashboard":
         st.header("Overview")
-        current_transactions = load_transactions(st.session_state.username)
-        budgets = load_budgets(st.session_state.username)
-        if not current_transactions.empty:
-            # Budget Alerts
-            if not budgets.empty:
-                for _, budget in budgets.iterrows():
-                    category_spent = current_transactions[(current_transactions['category'] == budget['category']) & \
-                                                         (current_transactions['type'] == 'expense')]['amount'].sum()
-                    if category_spent > budget['budget_amount'] and budget['budget_amount'] > 0:
-                        st.session_state.alerts.append(f"⚠️ Budget exceeded for {budget['category']}: Spent ₹{category_spent:.2f} against ₹{budget['budget_amount']:.2f}")
-            for alert in st.session_state.alerts:
-                st.warning(alert)
-            total_income = current_transactions[current_transactions['type'] == 'income']['amount'].sum()
-            total_expenses = current_transactions[current_transactions['type'] == 'expense']['amount'].sum()
+        category_totals = load_category_totals(st.session_state.username)
+        if not category_totals.empty:
+            expense_totals = category_totals[category_totals['type'] == 'expense'].set_index('category')['total']
+            # Budget Alerts: writes notify as they happen; budgets are re-checked once per session
+            if st.session_state.get("budgets_checked_for") != st.session_state.username:
+                check_budgets(st.session_state.username)
+                st.session_state.budgets_checked_for = st.session_state.username
+            page = min(st.session_state.get("notifications_page", 0), max(0, unread_count(st.session_state.username) - 1) // NOTIFICATIONS_PAGE_SIZE)
+            notifications, unread_total = list_notifications(st.session_state.username, page=page, unread_only=True)
+            if notifications:
+                for notification in notifications:
+                    if notification["kind"] in ("budget_exceeded", "anomaly"):
+                        st.warning(notification["message"])
+                    else:
+                        st.info(notification["message"])
+                col1, col2, col3, col4 = st.columns([1, 1, 2, 2])
+                if col1.button("◀ Newer", disabled=page == 0, key="notifications_newer"):
+                    st.session_state.notifications_page = page - 1
+                    st.rerun()
+                if col2.button("Older ▶", disabled=(page + 1) * NOTIFICATIONS_PAGE_SIZE >= unread_total, key="notifications_older"):
+                    st.session_state.notifications_page = page + 1
+                    st.rerun()
+                col3.caption(f"{unread_total} unread notification(s)")
+                if col4.button("Mark all as read", key="notifications_mark_read"):
+                    mark_read(st.session_state.username)
+                    st.session_state.notifications_page = 0
+                    st.rerun()
+            total_income = category_totals[category_totals['type'] == 'income']['total'].sum()
+            total_expenses = expense_totals.sum()
             net_balance = total_income - total_expenses
             col1, col2, col3 = st.columns(3)
             with col1:
@@ -231,7 +207,7 @@ else:
                 st.metric(label="Net Balance 💼", value=f"₹{net_balance:,.2f}")
             st.markdown("---")
             st.subheader("Spending Breakdown by Category")
-            expense_by_category = current_transactions[current_transactions['type'] == 'expense'].groupby('category')['amount'].sum().reset_index()
+            expense_by_category = expense_totals.rename('amount').reset_index()
             if not expense_by_category.empty:
                 fig_pie = px.pie(expense_by_category, values='amount', names='category', title='Expense Distribution',
                                 hole=0.3, color_discrete_sequence=px.colors.qualitative.Pastel)
@@ -240,14 +216,15 @@ else:
             else:
                 st.info("No expenses to display breakdown.")
             st.subheader("Income vs. Expenses Over Time")
-            daily_summary = current_transactions.groupby(['date', 'type'])['amount'].sum().unstack(fill_value=0).reset_index()
-            daily_summary['net'] = daily_summary.get('income', 0) - daily_summary.get('expense', 0)
+            chart_range = st.radio("Range", list(CHART_RANGES), index=1, horizontal=True, key="dashboard_chart_range")
+            daily_summary, granularity = income_expense_series(st.session_state.username, CHART_RANGES[chart_range])
+            mode = chart_mode(len(daily_summary))
             fig_line = go.Figure()
-            if 'income' in daily_summary.columns and not daily_summary['income'].isna().all():
-                fig_line.add_trace(go.Scatter(x=daily_summary['date'], y=daily_summary['income'], mode='lines+markers', name='Income', line=dict(color='#28a745')))
-            if 'expense' in daily_summary.columns and not daily_summary['expense'].isna().all():
-                fig_line.add_trace(go.Scatter(x=daily_summary['date'], y=daily_summary['expense'], mode='lines+markers', name='Expenses', line=dict(color='#dc3545')))
-            fig_line.update_layout(title='Daily Income vs. Expenses', xaxis_title='Date', yaxis_title='Amount (₹)', 
+            if daily_summary['income'].any():
+                fig_line.add_trace(go.Scatter(x=daily_summary['date'], y=daily_summary['income'], mode=mode, name='Income', line=dict(color='#28a745')))
+            if daily_summary['expense'].any():
+                fig_line.add_trace(go.Scatter(x=daily_summary['date'], y=daily_summary['expense'], mode=mode, name='Expenses', line=dict(color='#dc3545')))
+            fig_line.update_layout(title=f"{RESOLUTION_LABELS[granularity]} Income vs. Expenses", xaxis_title='Date', yaxis_title='Amount (₹)', 
                                  hovermode="x unified", template="plotly_white")
             st.plotly_chart(fig_line, use_container_width=True)
             st_lottie(LOTTIE_FINANCIAL_GROWTH, height=200, key="financial_growth_animation")
@@ -297,28 +274,27 @@ else:
 
         # Budget warning logic (outside the form)
         if submitted and st.session_state["transaction_type"] == "Expense":
-            budgets = load_budgets(st.session_state.username)
-            if not budgets.empty:
-                budget_row = budgets[(budgets["category"] == st.session_state["category"])]
-                if not budget_row.empty:
-                    budget_amount = float(budget_row.iloc[0]["budget_amount"])
-                    transactions = load_transactions(st.session_state.username)
-                    spent = transactions[(transactions["category"] == st.session_state["category"]) & (transactions["type"] == "expense")]["amount"].sum()
-                    if spent + amount > budget_amount > 0:
-                        budget_warning_msg = f"You are exceeding the budget for {st.session_state['category']}! Budget: ₹{budget_amount:.2f}, Spent: ₹{spent:.2f}, This Transaction: ₹{amount:.2f}"
-                        show_confirm = True
-                        pending_transaction = {
-                            "username": st.session_state.username,
-                            "date": date.strftime(DATE_FORMAT),
-                            "type": st.session_state["transaction_type"].lower(),
-                            "category": st.session_state["category"],
-                            "amount": amount,
-                            "description": description
-                        }
-                        st.session_state["pending_transaction"] = pending_transaction
-                        st.session_state["confirm_budget"] = True
+            budget = category_budget_status(st.session_state.username, st.session_state["category"], as_of=date.strftime(DATE_FORMAT))
+            if budget:
+                budget_amount = budget["budget_amount"]
+                spent = budget["spent"]
+                if spent + amount > budget_amount > 0:
+                    budget_warning_msg = f"You are exceeding the budget for {st.session_state['category']}! Budget: ₹{budget_amount:.2f}, Spent: ₹{spent:.2f}, This Transaction: ₹{amount:.2f}"
+                    show_confirm = True
+                    pending_transaction = {
+                        "username": st.session_state.username,
+                        "date": date.strftime(DATE_FORMAT),
+                        "type": st.session_state["transaction_type"].lower(),
+                        "category": st.session_state["category"],
+                        "amount": amount,
+                        "description": description
+                    }
+                    st.session_state["pending_transaction"] = pending_transaction
+                    st.session_state["confirm_budget"] = True
         if submitted and not show_confirm:
             # No budget warning needed, proceed as normal
+            flagged, threshold = (is_anomalous(st.session_state.username, st.session_state["category"], amount)
+                                  if st.session_state["transaction_type"] == "Expense" else (False, None))
             success, msg = save_transaction(
                 username=st.session_state.username,
                 date=date.strftime(DATE_FORMAT),
@@ -329,7 +305,13 @@ else:
             )
             if success:
                 st.success(f"Transaction added: ₹{amount:.2f} ({st.session_state['transaction_type']}) for {st.session_state['category']} 🎉")
-                st.session_state.alerts.append(f"Added {st.session_state['transaction_type']}: ₹{amount:.2f} for {st.session_state['category']}")
+                notify(st.session_state.username, "transaction", f"Added {st.session_state['transaction_type']}: ₹{amount:.2f} for {st.session_state['category']}",
+                       category=st.session_state["category"], period=date.strftime(DATE_FORMAT))
+                if flagged:
+                    notify(st.session_state.username, "anomaly", f"⚠️ Unusually high {st.session_state['category']} expense: ₹{amount:.2f} (usually below ₹{threshold:.2f})",
+                           category=st.session_state["category"], period=date.strftime(DATE_FORMAT))
+                if st.session_state["transaction_type"] == "Expense":
+                    check_budget(st.session_state.username, st.session_state["category"], as_of=date.strftime(DATE_FORMAT))
                 st.rerun()
             else:
                 st.error(msg)
@@ -341,10 +323,16 @@ else:
             if col1.button("Continue and Add Transaction Anyway"):
                 tx = st.session_state.get("pending_transaction")
                 if tx:
+                    flagged, threshold = is_anomalous(tx['username'], tx['category'], tx['amount'])
                     success, msg = save_transaction(**tx)
                     if success:
                         st.success(f"Transaction added: ₹{tx['amount']:.2f} ({tx['type'].capitalize()}) for {tx['category']} 🎉")
-                        st.session_state.alerts.append(f"Added {tx['type'].capitalize()}: ₹{tx['amount']:.2f} for {tx['category']}")
+                        notify(tx['username'], "transaction", f"Added {tx['type'].capitalize()}: ₹{tx['amount']:.2f} for {tx['category']}",
+                               category=tx['category'], period=tx['date'])
+                        if flagged:
+                            notify(tx['username'], "anomaly", f"⚠️ Unusually high {tx['category']} expense: ₹{tx['amount']:.2f} (usually below ₹{threshold:.2f})",
+                                   category=tx['category'], period=tx['date'])
+                        check_budget(tx['username'], tx['category'], as_of=tx['date'])
                         st.session_state["confirm_budget"] = False
                         st.session_state["pending_transaction"] = None
                         st.rerun()
@@ -365,12 +353,15 @@ else:
         with st.form("budget_form", clear_on_submit=True):
             category = st.selectbox("Category", EXPENSE_CATEGORIES)
             budget_amount = st.number_input("Budget Amount (₹)", min_value=0.01, format="%.2f", step=0.01)
+            budget_period = st.selectbox("Budget Period", list(BUDGET_PERIODS), format_func=BUDGET_PERIODS.get)
             submit = st.form_submit_button("Set Budget")
             if submit:
-                success, msg = save_budget(st.session_state.username, category, budget_amount)
+                success, msg = save_budget(st.session_state.username, category, budget_amount, budget_period)
                 if success:
-                    st.success(f"Budget set for {category}: ₹{budget_amount:.2f} 🎉")
-                    st.session_state.alerts.append(f"Budget set for {category}: ₹{budget_amount:.2f}")
+                    st.success(f"Budget set for {category}: ₹{budget_amount:.2f} ({BUDGET_PERIODS[budget_period].lower()}) 🎉")
+                    notify(st.session_state.username, "budget_set", f"Budget set for {category}: ₹{budget_amount:.2f} ({BUDGET_PERIODS[budget_period].lower()})",
+                           category=category)
+                    check_budget(st.session_state.username, category)
                     st.rerun()
                 else:
                     st.error(msg)
@@ -378,37 +369,74 @@ else:
     # --- History Page ---
     elif selected == "History":
         st.header("Transaction History")
-        current_transactions = load_transactions(st.session_state.username)
-        if current_transactions.empty:
+        with st.expander("Import Bank Statement (CSV/OFX)"):
+            statement = st.file_uploader("Statement file", type=["csv", "ofx", "qfx"], key="statement_upload")
+            if statement is not None and st.button("Import Statement"):
+                from importer import import_statement
+                try:
+                    summary = import_statement(st.session_state.username, statement)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    check_budgets(st.session_state.username)
+                    st.success(f"Imported {summary['imported']} transactions ({summary['duplicates']} duplicates skipped, {summary['invalid']} invalid rows).")
+        all_categories = load_categories(st.session_state.username)
+        if not all_categories:
             st.info("No transaction history available.")
             st_lottie(LOTTIE_DATA_ANALYSIS, height=200, key="no_history_data")
         else:
-            import io
-            st.dataframe(current_transactions.sort_values(by='date', ascending=False).reset_index(drop=True), use_container_width=True)
-            csv_buffer = io.StringIO()
-            current_transactions.to_csv(csv_buffer, index=False)
-            st.download_button(
-                label="Download as CSV",
-                data=csv_buffer.getvalue(),
-                file_name="transaction_history.csv",
-                mime="text/csv"
-            )
             st.subheader("Filter and Analyze History")
-            col1, col2 = st.columns(2)
+            col1, col2, col3, col4 = st.columns(4)
             with col1:
                 filter_type = st.selectbox("Filter by Type", ["All", "Expense", "Income"])
             with col2:
-                all_categories = list(set(current_transactions['category'].tolist()))
                 filter_category = st.selectbox("Filter by Category", ["All"] + all_categories)
-            filtered_df = current_transactions.copy()
-            if filter_type != "All":
-                filtered_df = filtered_df[filtered_df['type'] == filter_type.lower()]
-            if filter_category != "All":
-                filtered_df = filtered_df[filtered_df['category'] == filter_category]
-            st.dataframe(filtered_df.sort_values(by='date', ascending=False).reset_index(drop=True), use_container_width=True)
+            with col3:
+                date_range = st.date_input("Date Range", value=(), key="history_date_range")
+            with col4:
+                sort_order = st.selectbox("Sort", ["Newest first", "Oldest first"])
+            history_filters = {
+                "type": filter_type.lower() if filter_type != "All" else None,
+                "category": filter_category if filter_category != "All" else None,
+                "start_date": date_range[0].strftime(DATE_FORMAT) if len(date_range) == 2 else None,
+                "end_date": date_range[1].strftime(DATE_FORMAT) if len(date_range) == 2 else None,
+                "descending": sort_order == "Newest first",
+            }
+            # Keyset pagination: keep the cursor of every visited page, reset when the filters change
+            if st.session_state.get("history_filters") != history_filters:
+                st.session_state["history_filters"] = history_filters
+                st.session_state["history_cursors"] = [None]
+            # Export is generated only when the button is clicked, streamed from SQLite
+            export_filters = {k: v for k, v in history_filters.items() if k != "descending"}
+            compress_export = st.checkbox("Compress download (gzip)", value=False, key="history_export_gzip")
+            # The data callable runs off the script thread, where st.session_state is not available
+            export_user = st.session_state.username
+            st.download_button(
+                label="Download as CSV",
+                data=lambda: as_file(iter_transactions_csv(export_user, gzip=compress_export, **export_filters)),
+                file_name="transaction_history.csv.gz" if compress_export else "transaction_history.csv",
+                mime="application/gzip" if compress_export else "text/csv"
+            )
+            cursors = st.session_state["history_cursors"]
+            page_df, total, next_cursor = query_transactions(st.session_state.username, cursor=cursors[-1], **history_filters)
+            page_start = (len(cursors) - 1) * HISTORY_PAGE_SIZE
+            st.dataframe(page_df, use_container_width=True, hide_index=True)
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                if st.button("⬅ Previous", disabled=len(cursors) == 1):
+                    cursors.pop()
+                    st.rerun()
+            with col2:
+                st.caption(f"Showing {page_start + 1 if total else 0}–{page_start + len(page_df)} of {total} transactions")
+            with col3:
+                if st.button("Next ➡", disabled=next_cursor is None):
+                    cursors.append(next_cursor)
+                    st.rerun()
 
     # --- Forecast Page ---
     elif selected == "Forecast":
+        # Warm up the ML stack for the background jobs while the page renders
+        prefetch("ml_model")
         st.header("Financial Forecasting")
         st.write("Predict your future expenses based on historical spending patterns.")
         # Model selection always visible
@@ -421,35 +449,54 @@ else:
         model_choice = st.selectbox("Choose Forecasting Model to View", selected_models, key="forecast_model_choice")
         # Demo Data for everyone (now in Forecast section)
         from transactions import add_demo_transactions
-        demo_n = st.number_input("How many demo transactions to add?", min_value=20, max_value=180, value=60, step=1, key="demo_n_forecast")
+        demo_n = st.number_input("How many demo transactions to add?", min_value=20, max_value=1825, value=60, step=1, key="demo_n_forecast")
         if st.button(f"Add {demo_n} Demo Transactions for Forecasting"):
             add_demo_transactions(st.session_state.username, int(demo_n))
             st.success(f"{demo_n} demo transactions added for user {st.session_state.username}. Now you can forecast!")
             st.rerun()
-        current_transactions = load_transactions(st.session_state.username)
-        expense_data = current_transactions[current_transactions['type'] == 'expense'].copy()
+        expense_data = transaction_view(st.session_state.username, type='expense')
         unique_expense_days = expense_data['date'].nunique()
-        if unique_expense_days < 10:
-            st.warning(f"Not enough daily expense data (at least 10 unique days required, you have {unique_expense_days}). Add more daily entries to train a reliable forecasting model.")
+        if unique_expense_days < MIN_FORECAST_DAYS:
+            st.warning(f"Not enough daily expense data (at least {MIN_FORECAST_DAYS} unique days required, you have {unique_expense_days}). Add more daily entries to train a reliable forecasting model.")
             st_lottie(LOTTIE_FORECAST, height=200, key="no_forecast_data_animation")
         else:
             num_days_forecast = st.slider("Forecast for how many days?", 7, 90, 30)
-            with st.spinner("Training models and generating forecast..."):
+            forecast_method = st.radio("Forecast method", ["Direct (fast)", "Recursive"], horizontal=True, key="forecast_method",
+                                       help="Direct predicts every day in one batch; Recursive feeds each prediction into the next day's lags.")
+            forecast_mode = "direct" if forecast_method.startswith("Direct") else "recursive"
+            show_metrics = st.checkbox('Show model accuracy metrics', value=False)
+            # Training runs as background jobs; the latest finished forecast is shown while a fresh one trains
+            forecast_jobs = {
+                m: submit_job(st.session_state.username, "forecast", {"model_type": m, "num_days": int(num_days_forecast), "mode": forecast_mode},
+                              group={"model_type": m})
+                for m in selected_models
+            }
+            forecast_pending = any(get_job(job_id)["status"] in ("pending", "running") for job_id in forecast_jobs.values())
+
+            @st.fragment(run_every=2 if forecast_pending else None)
+            def show_forecast_results():
                 results = {}
-                for model_type in selected_models:
-                    model, scaler, metrics, features = train_model(expense_data, model_type=model_type)
-                    if model is not None:
-                        forecast_df, predict_error = predict_future_expenses(model, scaler, expense_data, num_days=num_days_forecast, features=features)
-                        results[model_type] = {
-                            "forecast_df": forecast_df,
-                            "metrics": metrics,
-                            "error": predict_error,
-                            "model": model,
-                            "scaler": scaler,
-                            "features": features
+                still_running = []
+                for m, job_id in forecast_jobs.items():
+                    job = get_job(job_id)
+                    if job["status"] in ("pending", "running"):
+                        still_running.append((m, job["progress"]))
+                        job = latest_finished_job(st.session_state.username, "forecast", {"model_type": m})
+                    elif job["status"] == "failed":
+                        st.error(f"{m}: {job['error']}")
+                        continue
+                    if job is not None:
+                        results[m] = {
+                            "forecast_df": forecast_frame(job),
+                            "metrics": tuple(job["result"]["metrics"]),
+                            "stale": job["id"] != job_id,
                         }
+                for m, progress in still_running:
+                    st.progress(progress, text=f"Training {m}..." + (" (showing previous forecast)" if m in results else ""))
+                if forecast_pending and not still_running:
+                    # Everything finished: rerun the page once so polling stops
+                    st.rerun()
                 # Show metrics for all models
-                show_metrics = st.checkbox('Show model accuracy metrics', value=False)
                 if results and show_metrics:
                     st.subheader("Model Accuracy Metrics")
                     metric_cols = st.columns(len(results))
@@ -466,13 +513,15 @@ else:
                     forecast_df = results[model_choice]["forecast_df"]
                     mae, r2 = results[model_choice]["metrics"]
                     if forecast_df is not None:
-                        st.subheader(f"Predicted Expenses for the Next {num_days_forecast} Days ({model_choice})")
+                        st.subheader(f"Predicted Expenses for the Next {len(forecast_df)} Days ({model_choice})")
+                        if results[model_choice]["stale"]:
+                            st.caption("Showing the previous forecast while an updated one trains.")
                         st.dataframe(forecast_df, use_container_width=True)
                         fig_forecast = px.line(forecast_df, x='date', y='predicted_expense',
                                               title=f'Future Expense Prediction (MAE: {mae:.2f}, R²: {r2:.2f})',
                                               labels={'date': 'Date', 'predicted_expense': 'Predicted Expense (₹)'},
                                               color_discrete_sequence=['#ff7f0e'])
-                        historical_daily_expenses = expense_data.groupby('date')['amount'].sum().reset_index()
+                        historical_daily_expenses = downsample(expense_data.groupby('date')['amount'].sum().reset_index(), 'date', 'amount')
                         fig_forecast.add_trace(go.Scatter(x=historical_daily_expenses['date'], y=historical_daily_expenses['amount'],
                                                         mode='lines', name='Historical Expenses', line=dict(color='#1f77b4')))
                         fig_forecast.update_layout(hovermode="x unified", template="plotly_white")
@@ -498,11 +547,13 @@ else:
                     )
                     st.plotly_chart(fig_bar, use_container_width=True)
 
+            show_forecast_results()
+
     # --- Insights Page ---
     elif selected == "Insights":
         st.header("Personalized Financial Insights")
-        current_transactions = load_transactions(st.session_state.username)
-        if current_transactions.empty:
+        monthly_rollups = analytics.period_totals(st.session_state.username, 'month')
+        if monthly_rollups.empty:
             st.info("No data available to generate insights. Add transactions to get started!")
             st_lottie(LOTTIE_DATA_ANALYSIS, height=200, key="no_insights_data_animation")
         else:
@@ -514,93 +565,62 @@ else:
             # Spending Trends
             if show_trends:
                 st.subheader("Spending Trends Over Time")
-                df = current_transactions.copy()
-                df['date'] = pd.to_datetime(df['date'])
-                df['month'] = df['date'].dt.to_period('M').astype(str)
-                monthly = df[df['type']=='expense'].groupby('month')['amount'].sum().reset_index()
+                df = monthly_rollups[monthly_rollups['type']=='expense'].rename(columns={'period': 'month', 'total': 'amount'})
+                monthly = df.groupby('month')['amount'].sum().reset_index()
                 fig = px.line(monthly, x='month', y='amount', title='Total Expenses by Month', markers=True)
                 st.plotly_chart(fig, use_container_width=True)
-                top_cats = df[df['type']=='expense'].groupby('category')['amount'].sum().nlargest(3).index.tolist()
-                cat_month = df[(df['type']=='expense') & (df['category'].isin(top_cats))].groupby(['month','category'])['amount'].sum().reset_index()
+                top_cats = analytics.top_categories(st.session_state.username, 3).index.tolist()
+                cat_month = df[df['category'].isin(top_cats)].groupby(['month','category'])['amount'].sum().reset_index()
                 fig2 = px.line(cat_month, x='month', y='amount', color='category', title='Top Categories by Month', markers=True)
                 st.plotly_chart(fig2, use_container_width=True)
             # Savings/Burn Rate
             if show_savings:
                 st.subheader("Savings Rate & Burn Rate")
-                df = current_transactions.copy()
-                df['date'] = pd.to_datetime(df['date'])
-                df['month'] = df['date'].dt.to_period('M').astype(str)
-                monthly_income = df[df['type']=='income'].groupby('month')['amount'].sum()
-                monthly_expense = df[df['type']=='expense'].groupby('month')['amount'].sum()
-                savings = (monthly_income - monthly_expense).fillna(0)
-                savings_rate = (savings / monthly_income.replace(0, pd.NA)).fillna(0)
-                burn_rate = monthly_expense
+                summary = analytics.savings_summary(st.session_state.username)
                 metrics = st.columns(3)
                 with metrics[0]:
-                    st.metric("Avg. Monthly Savings", f"₹{savings.mean():,.2f}")
+                    st.metric("Avg. Monthly Savings", f"₹{summary['savings'].mean():,.2f}")
                 with metrics[1]:
-                    st.metric("Avg. Savings Rate", f"{(savings_rate.mean()*100):.1f}%")
+                    st.metric("Avg. Savings Rate", f"{(summary['savings_rate'].mean()*100):.1f}%")
                 with metrics[2]:
-                    st.metric("Avg. Burn Rate", f"₹{burn_rate.mean():,.2f}")
-                burn_df = pd.DataFrame({
-                    'month': monthly_expense.index,
-                    'Savings': savings.values,
-                    'Burn Rate': burn_rate.values,
-                    'Income': monthly_income.reindex(monthly_expense.index, fill_value=0).values
-                })
+                    st.metric("Avg. Burn Rate", f"₹{summary['expense'].mean():,.2f}")
+                burn_df = summary.rename(columns={'savings': 'Savings', 'expense': 'Burn Rate', 'income': 'Income'})
                 fig3 = px.line(burn_df, x='month', y=['Savings','Burn Rate','Income'], title='Savings, Burn Rate, and Income by Month', markers=True)
                 st.plotly_chart(fig3, use_container_width=True)
             # Anomaly Detection
             if show_anomalies:
                 st.subheader("Expense Anomalies (Outliers)")
-                df = current_transactions.copy()
-                df['date'] = pd.to_datetime(df['date'])
-                df_exp = df[df['type']=='expense'].copy()
-                anomalies = []
-                for cat in df_exp['category'].unique():
-                    cat_df = df_exp[df_exp['category']==cat]
-                    mean = cat_df['amount'].mean()
-                    std = cat_df['amount'].std()
-                    threshold = mean + 2*std
-                    outliers = cat_df[cat_df['amount'] > threshold]
-                    anomalies.append(outliers)
-                anomalies_df = pd.concat(anomalies) if anomalies else pd.DataFrame(columns=df_exp.columns)
+                anomaly_baseline = st.radio("Compare each expense with", ["All history", "Previous 90 days"], horizontal=True, key='anomaly_baseline')
+                df_exp = transaction_view(st.session_state.username, type='expense')
+                if anomaly_baseline == "All history":
+                    anomalies_df = find_anomalies(df_exp)
+                else:
+                    anomalies_df = find_rolling_anomalies(df_exp, window='90D')
                 if not anomalies_df.empty:
-                    st.dataframe(anomalies_df[['date','category','amount','description']].sort_values(by='amount', ascending=False).reset_index(drop=True), use_container_width=True)
+                    st.dataframe(anomalies_df[['date','category','amount','threshold','description']].sort_values(by='amount', ascending=False).reset_index(drop=True), use_container_width=True)
                 else:
                     st.info("No unusually high expenses detected.")
             # Spending Recommendation Engine
             show_recommend = st.checkbox('Show Spending Recommendations', value=True, key='show_recommend')
             if show_recommend:
                 st.subheader('Spending Recommendations')
-                df = current_transactions.copy()
-                df['date'] = pd.to_datetime(df['date'])
-                df_exp = df[df['type']=='expense'].copy()
-                # Last 3 months
-                last_month = df_exp['date'].max().to_period('M')
-                recent = df_exp[df_exp['date'] >= (df_exp['date'].max() - pd.DateOffset(months=3))]
-                # Category averages
-                cat_avg = df_exp.groupby('category')['amount'].mean()
-                recent_cat = recent.groupby('category')['amount'].mean()
-                tips = []
-                for cat in recent_cat.index:
-                    if cat in cat_avg and recent_cat[cat] > cat_avg[cat]*1.3 and cat_avg[cat] > 0:
-                        overspend = recent_cat[cat] - cat_avg[cat]
-                        tips.append(f"You are spending <b>₹{overspend:.0f}</b> more than usual per transaction on <b>{cat}</b>. Consider reducing this category.")
+                # Last 3 months vs all-time average per transaction
+                recommendations = analytics.spending_recommendations(st.session_state.username, months=3)
+                tips = [f"You are spending <b>₹{row.overspend:.0f}</b> more than usual per transaction on <b>{row.category}</b>. Consider reducing this category."
+                        for row in recommendations.itertuples()]
                 if tips:
                     for tip in tips:
                         st.markdown(f"<div style='background:#fff3cd;padding:10px;border-radius:5px;margin-bottom:5px;'>{tip}</div>", unsafe_allow_html=True)
                 else:
                     st.success('Your recent spending is in line with your usual habits. Great job!')
             st.subheader("Spending Habits Analysis")
-            monthly_expenses = current_transactions[current_transactions['type'] == 'expense'].copy()
+            monthly_expenses = monthly_rollups[monthly_rollups['type'] == 'expense'].rename(columns={'total': 'amount'})
             if not monthly_expenses.empty:
-                monthly_expenses['month_year'] = monthly_expenses['date'].astype(str).str[:7]
-                avg_monthly_expense = monthly_expenses.groupby('month_year')['amount'].sum().mean()
+                avg_monthly_expense = monthly_expenses.groupby('period')['amount'].sum().mean()
                 st.markdown(f"Your average monthly spending is around <b>₹{avg_monthly_expense:,.2f}</b>.", unsafe_allow_html=True)
             else:
                 st.info("No expense data to analyze spending habits.")
-            top_expense_categories = monthly_expenses.groupby('category')['amount'].sum().nlargest(3)
+            top_expense_categories = analytics.top_categories(st.session_state.username, 3)
             if not top_expense_categories.empty:
                 st.write("Your top 3 spending categories are:")
                 for category, amount in top_expense_categories.items():
@@ -609,8 +629,8 @@ else:
             else:
                 st.info("No top expense categories to display.")
             st.subheader("Saving Potential")
-            total_income = current_transactions[current_transactions['type'] == 'income']['amount'].sum()
-            total_expenses = current_transactions[current_transactions['type'] == 'expense']['amount'].sum()
+            total_income = monthly_rollups[monthly_rollups['type'] == 'income']['total'].sum()
+            total_expenses = monthly_rollups[monthly_rollups['type'] == 'expense']['total'].sum()
             net_balance = total_income - total_expenses
             if net_balance > 0:
                 st.markdown(f"<div style='color: #3c763d; background-color: #dff0d8; padding: 10px; border-radius: 5px;'>Great! You have a positive net balance of <b>₹{net_balance:,.2f}</b>. Keep it up!</div>", unsafe_allow_html=True)
@@ -625,22 +645,8 @@ else:
             import pandas as pd
             # Weekly report
             with st.expander("Weekly Report", expanded=True):
-                with get_connection() as conn:
-                    c = conn.cursor()
-                    c.execute("""
-                        SELECT date(
-                            date, '-' || strftime('%w', date) || ' days'
-                        ) as week_start,
-                        type, SUM(amount) as total
-                        FROM transactions
-                        WHERE username = ?
-                        GROUP BY week_start, type
-                        ORDER BY week_start
-                    """, (st.session_state.username,))
-                    rows = c.fetchall()
-                import pandas as pd
-                import datetime
-                week_df = pd.DataFrame(rows, columns=["WeekStart", "Type", "Total"])
+                week_df = analytics.period_totals(st.session_state.username, 'week', by_category=False)[['period', 'type', 'total']]
+                week_df.columns = ["WeekStart", "Type", "Total"]
                 if not week_df.empty:
                     # Add week end and range columns
                     week_df["WeekStart"] = pd.to_datetime(week_df["WeekStart"])
@@ -655,17 +661,8 @@ else:
                     st.info("No weekly data available.")
             # Monthly report
             with st.expander("Monthly Report", expanded=True):
-                with get_connection() as conn:
-                    c = conn.cursor()
-                    c.execute("""
-                        SELECT strftime('%Y-%m', date) as month, type, SUM(amount) as total
-                        FROM transactions
-                        WHERE username = ?
-                        GROUP BY month, type
-                        ORDER BY month
-                    """, (st.session_state.username,))
-                    rows = c.fetchall()
-                month_df = pd.DataFrame(rows, columns=["Month", "Type", "Total"])
+                month_df = monthly_rollups.groupby(['period', 'type'], as_index=False)['total'].sum()
+                month_df.columns = ["Month", "Type", "Total"]
                 if not month_df.empty:
                     st.dataframe(month_df.pivot(index="Month", columns="Type", values="Total").fillna(0).reset_index(), use_container_width=True)
                     fig = px.bar(month_df, x="Month", y="Total", color="Type", barmode="group", title="Monthly Income & Expenses")
@@ -689,18 +686,13 @@ else:
     # --- Tax Report Page ---
     elif selected == "Tax Report":
         st.header("🧾 Tax Report: Year-End Financial Summary")
-        current_transactions = load_transactions(st.session_state.username)
-        if current_transactions.empty:
+        years = analytics.available_years(st.session_state.username)
+        if not years:
             st.info("No data available to generate a tax report. Add transactions to get started!")
             st_lottie(LOTTIE_DATA_ANALYSIS, height=200, key="no_tax_data_animation")
         else:
-            import pandas as pd
-            df = current_transactions.copy()
-            df['date'] = pd.to_datetime(df['date'])
-            df['year'] = df['date'].dt.year
-            years = sorted(df['year'].unique(), reverse=True)
             year = st.selectbox("Select Year", years, index=0)
-            year_df = df[df['year'] == year]
+            year_df = analytics.category_totals(st.session_state.username, year=year).rename(columns={'total': 'amount'})
             total_income = year_df[year_df['type']=='income']['amount'].sum()
             total_expense = year_df[year_df['type']=='expense']['amount'].sum()
             net_savings = total_income - total_expense
@@ -721,6 +713,8 @@ else:
             cat_summary['Deductible'] = cat_summary['category'].apply(lambda x: '✅' if x in deductible_cats else '')
             st.dataframe(cat_summary, use_container_width=True)
             st.markdown("<b>✅ = Potentially deductible expense (check with your tax advisor)</b>", unsafe_allow_html=True)
-            # Download as CSV
-            csv = cat_summary.to_csv(index=False).encode('utf-8')
-            st.download_button("Download Tax Report as CSV", csv, f"tax_report_{year}.csv", "text/csv") 
+            # Download as CSV (generated off the script thread, so capture the username here)
+            export_user = st.session_state.username
+            st.download_button("Download Tax Report as CSV",
+                               lambda: as_file(iter_tax_report_csv(export_user, year, deductible_cats)),
+                               f"tax_report_{year}.csv", "text/csv")
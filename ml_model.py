@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.svm import SVR
 from sklearn.preprocessing import StandardScaler
@@ -10,8 +11,9 @@ from xgboost import XGBRegressor
 def preprocess_data(df):
     if df.empty:
         return pd.DataFrame()
-    df = df.copy()
-    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    # Typed frames from transactions.load_transactions already carry datetime64 dates
+    if not pd.api.types.is_datetime64_any_dtype(df['date']):
+        df = df.assign(date=pd.to_datetime(df['date'], errors='coerce'))
     if df['date'].isna().all():
         return pd.DataFrame()
     df = df.sort_values(by='date')
@@ -35,9 +37,28 @@ def preprocess_data(df):
     return daily_expenses
 
 # --- ML Training ---
-def train_model(df, model_type='RandomForest'):
-    preprocessed_df = preprocess_data(df)
-    if preprocessed_df.empty or len(preprocessed_df) < 10:
+MIN_TRAINING_ROWS = 10  # after the first LAG_DAYS days are dropped for their missing lags
+
+# Default hyperparameters per model type
+MODEL_PARAMS = {
+    'RandomForest': {'n_estimators': 100, 'random_state': 42},
+    'SVM': {'kernel': 'rbf'},
+    'XGBoost': {'n_estimators': 100, 'learning_rate': 0.1, 'random_state': 42},
+}
+MODEL_CLASSES = {
+    'RandomForest': RandomForestRegressor,
+    'SVM': SVR,
+    'XGBoost': XGBRegressor,
+}
+
+def model_params(model_type, params=None):
+    return {**MODEL_PARAMS.get(model_type, {}), **(params or {})}
+
+def train_model(df, model_type='RandomForest', params=None):
+    return train_model_on_features(preprocess_data(df), model_type, params)
+
+def train_model_on_features(preprocessed_df, model_type='RandomForest', params=None):
+    if preprocessed_df.empty or len(preprocessed_df) < MIN_TRAINING_ROWS:
         return None, None, "Not enough historical data (at least 10 entries required) to train the model.", None
     features = [col for col in preprocessed_df.columns if 'lag_' in col or col in ['year', 'month', 'day', 'day_of_week', 'day_of_year']]
     target = 'daily_expense'
@@ -51,15 +72,9 @@ def train_model(df, model_type='RandomForest'):
     scaler = StandardScaler()
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
-    model = None
-    if model_type == 'RandomForest':
-        model = RandomForestRegressor(n_estimators=100, random_state=42)
-    elif model_type == 'SVM':
-        model = SVR(kernel='rbf')
-    elif model_type == 'XGBoost':
-        model = XGBRegressor(n_estimators=100, learning_rate=0.1, random_state=42)
-    else:
+    if model_type not in MODEL_CLASSES:
         return None, None, "Invalid model type specified.", None
+    model = MODEL_CLASSES[model_type](**model_params(model_type, params))
     try:
         model.fit(X_train_scaled, y_train)
         y_pred = model.predict(X_test_scaled)
@@ -74,31 +89,68 @@ def train_model(df, model_type='RandomForest'):
         return None, None, f"Error during model training: {str(e)}", None
 
 # --- ML Forecasting ---
-def predict_future_expenses(model, scaler, historical_df, num_days=30, features=None):
+LAG_DAYS = 7
+FORECAST_MODES = ('recursive', 'direct')
+
+def calendar_features(dates):
+    # Vectorized calendar columns for a DatetimeIndex, matching preprocess_data
+    day = dates.day.to_numpy()
+    day_of_week = dates.dayofweek.to_numpy()
+    return {
+        'year': dates.year.to_numpy(),
+        'month': dates.month.to_numpy(),
+        'day': day,
+        'day_of_week': day_of_week,
+        'day_of_year': dates.dayofyear.to_numpy(),
+        'is_first_of_month': (day == 1).astype(int),
+        'is_second_of_month': (day == 2).astype(int),
+        'is_fifth_of_month': (day == 5).astype(int),
+        'is_monday': (day_of_week == 0).astype(int),
+    }
+
+def predict_future_expenses(model, scaler, historical_df, num_days=30, features=None, mode='recursive', preprocessed_df=None):
+    # mode='recursive' feeds each prediction back in as lag_1 for the next day.
+    # mode='direct' predicts the whole horizon in one batched call; lags that fall in the
+    # future are filled with the latest observed value for the same weekday.
     if model is None or scaler is None or features is None:
         return None, "Model, scaler, or features not provided."
-    preprocessed_df = preprocess_data(historical_df)
-    if preprocessed_df.empty or len(preprocessed_df) < 7:
+    if mode not in FORECAST_MODES:
+        return None, f"Unknown forecast mode: {mode}"
+    if preprocessed_df is None:
+        preprocessed_df = preprocess_data(historical_df)
+    if preprocessed_df.empty or len(preprocessed_df) < LAG_DAYS:
         return None, "Not enough historical data (at least 7 days required) to generate future lags."
-    latest_data = preprocessed_df.tail(1).copy()
-    last_date = latest_data['date'].iloc[0]
-    future_dates = [last_date + pd.Timedelta(days=i) for i in range(1, num_days + 1)]
-    latest_lags = preprocessed_df[[f'lag_{i}' for i in range(1, 8)]].tail(1).values[0]
-    predictions = []
-    current_lags = latest_lags.tolist()
-    for _ in range(num_days):
-        input_dict = dict(zip([f'lag_{i}' for i in range(1, 8)], current_lags))
-        input_dict['year'] = last_date.year
-        input_dict['month'] = last_date.month
-        input_dict['day'] = last_date.day
-        input_dict['day_of_week'] = last_date.dayofweek
-        input_dict['day_of_year'] = last_date.dayofyear
-        input_features = pd.DataFrame([{k: input_dict[k] for k in features}])
-        input_scaled = scaler.transform(input_features)
-        predicted_expense = model.predict(input_scaled)[0]
-        predicted_expense = max(0, predicted_expense)
-        predictions.append(predicted_expense)
-        current_lags.pop(0)
-        current_lags.append(predicted_expense)
-        last_date += pd.Timedelta(days=1)
-    return pd.DataFrame({'date': future_dates, 'predicted_expense': predictions}), None 
\ No newline at end of file
+    last_date = preprocessed_df['date'].iloc[-1]
+    future_dates = pd.date_range(last_date + pd.Timedelta(days=1), periods=num_days, freq='D')
+    # Preallocated design matrix: calendar columns filled for the whole horizon up front
+    X = np.zeros((num_days, len(features)), dtype='float64')
+    calendar = calendar_features(future_dates)
+    lag_columns = np.full(LAG_DAYS, -1)
+    for j, feature in enumerate(features):
+        if feature.startswith('lag_'):
+            lag_columns[int(feature[4:]) - 1] = j
+        else:
+            X[:, j] = calendar[feature]
+    present = lag_columns >= 0
+    lag_positions = lag_columns[present]
+    # Most recent observed day first: history[0] is lag_1 for the first forecast day
+    history = preprocessed_df['daily_expense'].to_numpy(dtype='float64')[-LAG_DAYS:][::-1].copy()
+    mean = scaler.mean_ if scaler.with_mean else 0.0
+    scale = scaler.scale_ if scaler.with_std else 1.0
+    if mode == 'direct':
+        # offset = days between the target and the lag day; non-positive offsets are observed
+        offsets = np.arange(1, num_days + 1)[:, None] - np.arange(1, LAG_DAYS + 1)[None, :]
+        weeks_ahead = np.where(offsets > 0, -(-offsets // LAG_DAYS), 0)
+        observed = -(offsets - LAG_DAYS * weeks_ahead)
+        X[:, lag_positions] = history[observed[:, present]]
+        predictions = np.maximum(0, model.predict((X - mean) / scale))
+    else:
+        predictions = np.empty(num_days, dtype='float64')
+        lags = history
+        for i in range(num_days):
+            X[i, lag_positions] = lags[present]
+            predicted_expense = max(0.0, float(model.predict(((X[i] - mean) / scale)[None, :])[0]))
+            predictions[i] = predicted_expense
+            lags = np.roll(lags, 1)
+            lags[0] = predicted_expense
+    return pd.DataFrame({'date': future_dates, 'predicted_expense': predictions}), None
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+import pandas as pd
+from ml_model import preprocess_data, train_model_on_features, model_params
+
+# --- Model Registry ---
+# Fitted (model, scaler, metrics, features) keyed by user, model type, hyperparameters and a
+# fingerprint of the preprocessed training data, so unchanged data never trains twice.
+REGISTRY_MAX_ENTRIES = 32
+REGISTRY_MAX_BYTES = 256 * 1024 * 1024
+# Set to a directory to spill evicted models to disk with joblib (and reload them on a miss)
+SPILL_DIR = None
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+
+def data_fingerprint(preprocessed_df):
+    if preprocessed_df.empty:
+        return 'empty'
+    hashed = pd.util.hash_pandas_object(preprocessed_df, index=False).values
+    columns = ','.join(map(str, preprocessed_df.columns))
+    return hashlib.sha1(columns.encode('utf-8') + hashed.tobytes()).hexdigest()
+
+# Parameters that change how a model is fitted but not the fitted result
+RUNTIME_PARAMS = {'n_jobs'}
+
+def registry_key(username, model_type, params, fingerprint):
+    params = {k: v for k, v in model_params(model_type, params).items() if k not in RUNTIME_PARAMS}
+    params = json.dumps(params, sort_keys=True, default=str)
+    return (username, model_type, params, fingerprint)
+
+def _spill_path(key):
+    digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    return os.path.join(SPILL_DIR, f"{digest}.joblib")
+
+def _spill(key, value):
+    if not SPILL_DIR:
+        return
+    import joblib
+    os.makedirs(SPILL_DIR, exist_ok=True)
+    joblib.dump(value, _spill_path(key))
+
+def _load_spilled(key):
+    if not SPILL_DIR or not os.path.exists(_spill_path(key)):
+        return None
+    import joblib
+    try:
+        return joblib.load(_spill_path(key))
+    except Exception:
+        return None
+
+def _put(key, value):
+    size = len(pickle.dumps(value[:2], protocol=pickle.HIGHEST_PROTOCOL))
+    evicted = []
+    with _lock:
+        if key in _entries:
+            return
+        _entries[key] = (value, size)
+        _stats['bytes'] += size
+        while len(_entries) > REGISTRY_MAX_ENTRIES or (_stats['bytes'] > REGISTRY_MAX_BYTES and len(_entries) > 1):
+            old_key, (old_value, old_size) = _entries.popitem(last=False)
+            _stats['bytes'] -= old_size
+            _stats['evictions'] += 1
+            evicted.append((old_key, old_value))
+    for old_key, old_value in evicted:
+        _spill(old_key, old_value)
+
+def lookup(key):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            _stats['hits'] += 1
+            return entry[0]
+    value = _load_spilled(key)
+    if value is not None:
+        with _lock:
+            _stats['disk_hits'] += 1
+        _put(key, value)
+    return value
+
+def get_model(username, df, model_type='RandomForest', params=None, preprocessed_df=None):
+    # Drop-in for ml_model.train_model: returns (model, scaler, metrics, features).
+    # Pass preprocessed_df when the caller already has the feature frame.
+    if preprocessed_df is None:
+        preprocessed_df = preprocess_data(df)
+    key = registry_key(username, model_type, params, data_fingerprint(preprocessed_df))
+    cached = lookup(key)
+    if cached is not None:
+        return cached
+    with _lock:
+        _stats['misses'] += 1
+    result = train_model_on_features(preprocessed_df, model_type, params)
+    if result[0] is not None:
+        _put(key, result)
+    return result
+
+def clear_registry():
+    with _lock:
+        _entries.clear()
+        _stats['bytes'] = 0
+
+def registry_stats():
+    with _lock:
+        return {'entries': len(_entries), **_stats}
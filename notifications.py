@@ -0,0 +1,70 @@
+from db import get_connection
+from transactions import budget_status, category_budget_status, BUDGET_PERIODS
+
+# --- Notifications ---
+# Persisted per-user notifications. (username, kind, category, period) identifies a notification, so
+# repeating the same event updates it instead of adding a copy; it becomes unread again only if
+# its message changed. Each user keeps at most NOTIFICATION_LIMIT, oldest dropped first.
+NOTIFICATION_LIMIT = 100
+NOTIFICATIONS_PAGE_SIZE = 5
+NOTIFICATION_COLUMNS = ['id', 'kind', 'category', 'period', 'message', 'read', 'created_at', 'updated_at']
+
+def notify(username, kind, message, category='', period=''):
+    with get_connection() as conn:
+        conn.execute('''INSERT INTO notifications (username, kind, category, period, message) VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT (username, kind, category, period) DO UPDATE SET
+                            message = excluded.message, read = 0, updated_at = CURRENT_TIMESTAMP
+                        WHERE message != excluded.message''',
+                     (username, kind, category or '', period or '', message))
+        conn.execute('''DELETE FROM notifications WHERE username = ? AND id NOT IN (
+                            SELECT id FROM notifications WHERE username = ?
+                            ORDER BY updated_at DESC, id DESC LIMIT ?)''', (username, username, NOTIFICATION_LIMIT))
+
+def list_notifications(username, page=0, page_size=NOTIFICATIONS_PAGE_SIZE, unread_only=False):
+    # Newest first; returns (list of dicts, total matching)
+    read_filter = 'AND read = 0' if unread_only else ''
+    with get_connection() as conn:
+        total = conn.execute(f'SELECT COUNT(*) FROM notifications WHERE username = ? {read_filter}', (username,)).fetchone()[0]
+        rows = conn.execute(f'''SELECT {', '.join(NOTIFICATION_COLUMNS)} FROM notifications
+                                WHERE username = ? {read_filter}
+                                ORDER BY updated_at DESC, id DESC LIMIT ? OFFSET ?''',
+                            (username, page_size, page * page_size)).fetchall()
+    return [dict(zip(NOTIFICATION_COLUMNS, row)) for row in rows], total
+
+def unread_count(username):
+    with get_connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM notifications WHERE username = ? AND read = 0', (username,)).fetchone()[0]
+
+def mark_read(username, ids=None):
+    # Marks the given notification ids (default: all of the user's) as read
+    with get_connection() as conn:
+        if ids is None:
+            conn.execute('UPDATE notifications SET read = 1 WHERE username = ? AND read = 0', (username,))
+        else:
+            ids = list(ids)
+            if ids:
+                placeholders = ','.join('?' * len(ids))
+                conn.execute(f'UPDATE notifications SET read = 1 WHERE username = ? AND id IN ({placeholders})', (username, *ids))
+
+def clear_notifications(username):
+    with get_connection() as conn:
+        conn.execute('DELETE FROM notifications WHERE username = ?', (username,))
+
+# --- Budget Notifications ---
+def _notify_budget(username, budget):
+    notify(username, 'budget_exceeded',
+           f"⚠️ Budget exceeded for {budget['category']} ({BUDGET_PERIODS[budget['period']].lower()}): "
+           f"Spent ₹{budget['spent']:.2f} against ₹{budget['budget_amount']:.2f}",
+           category=budget['category'], period=budget['period_key'])
+
+def check_budget(username, category, as_of=None):
+    # After a change to one category: notifies if its budget is exceeded for the period containing as_of
+    budget = category_budget_status(username, category, as_of)
+    if budget and budget['exceeded']:
+        _notify_budget(username, budget)
+
+def check_budgets(username, as_of=None):
+    # Same for all of the user's budgets (after imports, or once per session)
+    budgets = budget_status(username, as_of)
+    for budget in budgets[budgets['exceeded']].to_dict('records'):
+        _notify_budget(username, budget)
@@ -0,0 +1,70 @@
+import argparse
+import pandas as pd
+from db import get_connection, init_db, ROLLUP_PERIODS
+from db import rebuild_rollups as _rebuild_rollups
+from cache import cached_frame, bump_version, frame_cache
+
+# --- Rollup Queries ---
+# Totals per (period, type, category) kept up to date by triggers on transactions.
+# Granularities: 'day', 'week' (Sunday start), 'month' (YYYY-MM) and 'year' (YYYY).
+def load_rollups(username, granularity, type=None, by_category=True):
+    if granularity not in ROLLUP_PERIODS:
+        raise ValueError(f"Unknown rollup granularity: {granularity}")
+    return cached_frame(username, ('rollups', granularity, type, by_category),
+                        lambda: _query_rollups(username, granularity, type, by_category))
+
+def _query_rollups(username, granularity, type, by_category):
+    params = [username, granularity]
+    type_filter = ''
+    if type:
+        type_filter = 'AND type = ?'
+        params.append(type)
+    with get_connection() as conn:
+        c = conn.cursor()
+        if by_category:
+            c.execute(f'''SELECT period, type, category, total, count FROM rollups
+                          WHERE username = ? AND granularity = ? {type_filter}
+                          ORDER BY period''', params)
+            columns = ['period', 'type', 'category', 'total', 'count']
+        else:
+            c.execute(f'''SELECT period, type, SUM(total), SUM(count) FROM rollups
+                          WHERE username = ? AND granularity = ? {type_filter}
+                          GROUP BY period, type ORDER BY period''', params)
+            columns = ['period', 'type', 'total', 'count']
+        rows = c.fetchall()
+        return pd.DataFrame(rows, columns=columns) if rows else pd.DataFrame(columns=columns)
+
+def load_category_totals(username, type=None):
+    # All-time totals per (type, category), summed from the yearly rollups
+    return cached_frame(username, ('category_totals', type), lambda: _query_category_totals(username, type))
+
+def _query_category_totals(username, type):
+    params = [username]
+    type_filter = ''
+    if type:
+        type_filter = 'AND type = ?'
+        params.append(type)
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(f'''SELECT type, category, SUM(total), SUM(count) FROM rollups
+                      WHERE username = ? AND granularity = 'year' {type_filter}
+                      GROUP BY type, category''', params)
+        rows = c.fetchall()
+        columns = ['type', 'category', 'total', 'count']
+        return pd.DataFrame(rows, columns=columns) if rows else pd.DataFrame(columns=columns)
+
+def rebuild_rollups(username=None):
+    with get_connection() as conn:
+        _rebuild_rollups(conn, username)
+    if username:
+        bump_version(username)
+    else:
+        frame_cache.clear()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild rollup tables from raw transactions.")
+    parser.add_argument("--user", help="Only rebuild rollups for this username")
+    args = parser.parse_args()
+    init_db()
+    rebuild_rollups(args.user)
+    print(f"Rollups rebuilt for {args.user or 'all users'}.")
@@ -0,0 +1,61 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from ml_model import preprocess_data
+from model_registry import get_model
+from feature_store import load_features
+
+# --- Parallel Model Training ---
+# sklearn and XGBoost release the GIL while fitting, so a shared thread pool lets the
+# selected models train side by side. The pool is process-wide to bound total CPU use.
+TRAIN_WORKERS = 3
+TRAIN_TIMEOUT = 120
+# Estimators that accept n_jobs; SVR is single-threaded
+PARALLEL_MODELS = {'RandomForest', 'XGBoost'}
+
+_executor = ThreadPoolExecutor(max_workers=TRAIN_WORKERS, thread_name_prefix="train")
+
+def jobs_per_model(n_models):
+    # Split the cores between the models fitting at the same time
+    concurrent = max(1, min(n_models, TRAIN_WORKERS))
+    return max(1, (os.cpu_count() or 1) // concurrent)
+
+def _train(username, preprocessed_df, model_type, params, started):
+    started[model_type] = time.monotonic()
+    start = time.perf_counter()
+    result = get_model(username, None, model_type, params, preprocessed_df=preprocessed_df)
+    return result, time.perf_counter() - start
+
+def train_models_parallel(username, df, model_types, params=None, timeout=TRAIN_TIMEOUT):
+    # Yields (model_type, (model, scaler, metrics, features), seconds) as each model finishes,
+    # fastest first. A model still fitting timeout seconds after it started (time spent queued on the
+    # shared pool does not count) is reported with an error message and left to finish in the
+    # background (its result still lands in the model registry).
+    # With df=None the features come from the user's incremental feature store.
+    params = params or {}
+    preprocessed_df = load_features(username) if df is None else preprocess_data(df)
+    n_jobs = jobs_per_model(len(model_types))
+    started = {}
+    futures = {}
+    for model_type in model_types:
+        model_params = dict(params.get(model_type, {}))
+        if model_type in PARALLEL_MODELS:
+            model_params.setdefault('n_jobs', n_jobs)
+        futures[_executor.submit(_train, username, preprocessed_df, model_type, model_params, started)] = model_type
+    while futures:
+        # Wake up at the nearest deadline of a running model (polling while models are still queued)
+        now = time.monotonic()
+        deadlines = [started[m] + timeout - now for m in futures.values() if m in started]
+        done, _ = wait(futures, timeout=max(0, min(deadlines + [1.0])), return_when=FIRST_COMPLETED)
+        for future in done:
+            model_type = futures.pop(future)
+            try:
+                result, seconds = future.result()
+            except Exception as e:
+                result, seconds = (None, None, f"Error during model training: {str(e)}", None), None
+            yield model_type, result, seconds
+        now = time.monotonic()
+        for future, model_type in list(futures.items()):
+            if model_type in started and now - started[model_type] >= timeout and not future.done():
+                del futures[future]
+                yield model_type, (None, None, f"Training timed out after {timeout} seconds.", None), None
@@ -1,94 +1,275 @@
 import pandas as pd
+import numpy as np
 import os
 import filelock
 from datetime import datetime
-from db import get_connection, init_db
+from db import get_connection, init_db, transaction_hash, ROLLUP_PERIODS
+from cache import cached_frame, bump_version
 
 TRANSACTIONS_FILE = "transactions.csv"
 BUDGETS_FILE = "budgets.csv"
 DATE_FORMAT = "%Y-%m-%d"
 
 # --- Transaction Functions ---
+TRANSACTION_COLUMNS = ['id', 'username', 'date', 'type', 'category', 'amount', 'description']
+
 def load_transactions(username=None):
+    if username:
+        return cached_frame(username, 'transactions', lambda: _query_transactions(username))
+    return _query_transactions(None)
+
+def transaction_view(username, type=None, columns=None):
+    # Shared, read-only selection of the cached frame: no filter returns the cached frame itself,
+    # and filtered selections are cached per data version, so pages don't need their own .copy().
+    df = load_transactions(username)
+    if type is None and columns is None:
+        return df
+    key = ('transaction_view', type, tuple(columns) if columns else None)
+    def select():
+        view = df[df['type'] == type] if type else df
+        return view[list(columns)] if columns else view
+    return cached_frame(username, key, select)
+
+def _transactions_frame(rows):
+    # Builds the schema-fixed frame in one pass: dates parsed once, low-cardinality text as categoricals
+    ids, usernames, dates, types, categories, amounts, descriptions = zip(*rows) if rows else ((),) * 7
+    return pd.DataFrame({
+        'id': np.asarray(ids, dtype='int64'),
+        'username': pd.Categorical(usernames),
+        'date': pd.to_datetime(pd.Series(dates, dtype=object), format=DATE_FORMAT, errors='coerce'),
+        'type': pd.Categorical(types),
+        'category': pd.Categorical(categories),
+        'amount': np.asarray(amounts, dtype='float64'),
+        'description': pd.Series(descriptions, dtype=object),
+    }, columns=TRANSACTION_COLUMNS)
+
+def _query_transactions(username):
     with get_connection() as conn:
         c = conn.cursor()
         if username:
-            c.execute('SELECT id, username, date, type, category, amount, description FROM transactions WHERE username = ? ORDER BY date', (username,))
+            c.execute('SELECT id, username, date, type, category, amount, description FROM transactions WHERE username = ? ORDER BY date, id', (username,))
         else:
-            c.execute('SELECT id, username, date, type, category, amount, description FROM transactions ORDER BY date')
+            c.execute('SELECT id, username, date, type, category, amount, description FROM transactions ORDER BY date, id')
+        return _transactions_frame(c.fetchall())
+
+HISTORY_PAGE_SIZE = 50
+
+def transaction_filters(username, type=None, category=None, start_date=None, end_date=None):
+    clauses = ['username = ?']
+    params = [username]
+    if type:
+        clauses.append('type = ?')
+        params.append(type)
+    if category:
+        clauses.append('category = ?')
+        params.append(category)
+    if start_date:
+        clauses.append('date >= ?')
+        params.append(str(start_date))
+    if end_date:
+        clauses.append('date <= ?')
+        params.append(str(end_date))
+    return clauses, params
+
+def query_transactions(username, type=None, category=None, start_date=None, end_date=None,
+                       descending=True, cursor=None, limit=HISTORY_PAGE_SIZE):
+    # One page of a user's filtered history using keyset pagination on (date, id).
+    # cursor is the (date, id) of the last row of the previous page.
+    # Returns (page DataFrame, total matching rows, cursor for the next page or None).
+    clauses, params = transaction_filters(username, type, category, start_date, end_date)
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(f'SELECT COUNT(*) FROM transactions WHERE {" AND ".join(clauses)}', params)
+        total = c.fetchone()[0]
+        if cursor is not None:
+            clauses.append(f'(date, id) {"<" if descending else ">"} (?, ?)')
+            params.extend([str(cursor[0]), int(cursor[1])])
+        order = 'DESC' if descending else 'ASC'
+        c.execute(f'''SELECT id, username, date, type, category, amount, description FROM transactions
+                      WHERE {" AND ".join(clauses)}
+                      ORDER BY date {order}, id {order} LIMIT ?''', params + [limit + 1])
         rows = c.fetchall()
-        columns = ['id', 'username', 'date', 'type', 'category', 'amount', 'description']
-        return pd.DataFrame(rows, columns=columns) if rows else pd.DataFrame(columns=columns)
+    next_cursor = (rows[limit - 1][2], rows[limit - 1][0]) if len(rows) > limit else None
+    return _transactions_frame(rows[:limit]), total, next_cursor
+
+def load_categories(username, type=None):
+    # Distinct categories the user has transactions in, read from the (much smaller) yearly rollups
+    with get_connection() as conn:
+        c = conn.cursor()
+        if type:
+            c.execute("SELECT DISTINCT category FROM rollups WHERE username = ? AND granularity = 'year' AND type = ? ORDER BY category", (username, type))
+        else:
+            c.execute("SELECT DISTINCT category FROM rollups WHERE username = ? AND granularity = 'year' ORDER BY category", (username,))
+        return [row[0] for row in c.fetchall()]
+
+def _validate_transaction(username, date, type, category, amount):
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        return "Amount must be a number."
+    if not username or not date or not type or not category or amount <= 0:
+        return "All fields required and amount > 0."
+    return None
 
 def save_transaction(username, date, type, category, amount, description):
-    if not username or not date or not type or not category or float(amount) <= 0:
-        return False, "All fields required and amount > 0."
+    error = _validate_transaction(username, date, type, category, amount)
+    if error:
+        return False, error
     with get_connection() as conn:
         c = conn.cursor()
-        c.execute('''INSERT INTO transactions (username, date, type, category, amount, description)
-                     VALUES (?, ?, ?, ?, ?, ?)''',
-                  (username, date, type, category, float(amount), description))
-        return True, "Transaction saved."
+        c.execute('''INSERT INTO transactions (username, date, type, category, amount, description, content_hash)
+                     VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                  (username, date, type, category, float(amount), description,
+                   transaction_hash(username, date, amount, description)))
+    bump_version(username, changed_from=str(date))
+    return True, "Transaction saved."
+
+HASH_LOOKUP_BATCH = 500
+DUPLICATE_MESSAGE = "Duplicate transaction."
+
+def _existing_hash_counts(conn, username, hashes):
+    # content_hash -> number of the user's stored transactions with it
+    counts = {}
+    hashes = list(hashes)
+    for start in range(0, len(hashes), HASH_LOOKUP_BATCH):
+        batch = hashes[start:start + HASH_LOOKUP_BATCH]
+        placeholders = ','.join('?' * len(batch))
+        rows = conn.execute(f'''SELECT content_hash, COUNT(*) FROM transactions
+                                WHERE username = ? AND content_hash IN ({placeholders}) GROUP BY content_hash''',
+                            [username, *batch]).fetchall()
+        counts.update(rows)
+    return counts
+
+def save_transactions_bulk(username, rows, skip_duplicates=False, dedupe_state=None):
+    # rows: iterable of dicts with date/type/category/amount/description keys.
+    # Valid rows are inserted in a single transaction; returns one (success, message) per row.
+    # With skip_duplicates, a row is skipped only while the user already had more stored copies of its
+    # content hash than the batch has shown so far, so genuine repeats (two identical rows on the same
+    # day) are kept on a first import and skipped on a re-import. Pass the same dedupe_state dict to
+    # every chunk of one import so copies seen (and inserted) by earlier chunks are counted.
+    results = []
+    params = []
+    for row in rows:
+        error = _validate_transaction(username, row.get('date'), row.get('type'), row.get('category'), row.get('amount'))
+        if error:
+            results.append((False, error))
+            continue
+        description = row.get('description', '')
+        params.append((username, row['date'], row['type'], row['category'], float(row['amount']), description,
+                       transaction_hash(username, row['date'], row['amount'], description)))
+        results.append((True, "Transaction saved."))
+    if not params:
+        return results
+    with get_connection() as conn:
+        if skip_duplicates:
+            state = {} if dedupe_state is None else dedupe_state  # hash -> (copies seen, copies inserted)
+            stored = _existing_hash_counts(conn, username, {p[-1] for p in params})
+            # Copies stored before this import: the current count minus what earlier chunks inserted
+            before = {h: count - state.get(h, (0, 0))[1] for h, count in stored.items()}
+            kept = []
+            valid = iter(i for i, (ok, _) in enumerate(results) if ok)
+            for p in params:
+                i = next(valid)
+                seen, inserted = state.get(p[-1], (0, 0))
+                seen += 1
+                if seen <= before.get(p[-1], 0):
+                    results[i] = (False, DUPLICATE_MESSAGE)
+                else:
+                    inserted += 1
+                    kept.append(p)
+                state[p[-1]] = (seen, inserted)
+            params = kept
+        conn.executemany('''INSERT INTO transactions (username, date, type, category, amount, description, content_hash)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)''', params)
+    if params:
+        bump_version(username, changed_from=min(str(p[1]) for p in params))
+    return results
+
+# --- Budget Functions ---
+# A budget caps expense spend in a category over its period: 'all' is lifetime spend, the others
+# the calendar year/month/week (Sunday start) containing the given date.
+BUDGET_PERIODS = {'all': 'All time', 'year': 'Yearly', 'month': 'Monthly', 'week': 'Weekly'}
 
 def load_budgets(username=None):
+    if username:
+        return cached_frame(username, 'budgets', lambda: _query_budgets(username))
+    return _query_budgets(None)
+
+def _query_budgets(username):
     with get_connection() as conn:
         c = conn.cursor()
         if username:
-            c.execute('SELECT id, username, category, budget_amount FROM budgets WHERE username = ?', (username,))
+            c.execute('SELECT id, username, category, budget_amount, period FROM budgets WHERE username = ?', (username,))
         else:
-            c.execute('SELECT id, username, category, budget_amount FROM budgets')
+            c.execute('SELECT id, username, category, budget_amount, period FROM budgets')
         rows = c.fetchall()
-        columns = ['id', 'username', 'category', 'budget_amount']
+        columns = ['id', 'username', 'category', 'budget_amount', 'period']
         return pd.DataFrame(rows, columns=columns) if rows else pd.DataFrame(columns=columns)
 
-def save_budget(username, category, budget_amount):
+def save_budget(username, category, budget_amount, period='all'):
     if not username or not category or float(budget_amount) <= 0:
         return False, "All fields required and budget > 0."
+    if period not in BUDGET_PERIODS:
+        return False, f"Budget period must be one of: {', '.join(BUDGET_PERIODS)}."
     with get_connection() as conn:
         c = conn.cursor()
-        # Remove existing budget for this user/category
-        c.execute('DELETE FROM budgets WHERE username = ? AND category = ?', (username, category))
-        c.execute('INSERT INTO budgets (username, category, budget_amount) VALUES (?, ?, ?)', (username, category, float(budget_amount)))
-        return True, "Budget saved."
-
-def add_demo_transactions(username, n=90):
-    import random
-    from datetime import timedelta
-    today = datetime.today()
-    descs = ["Lunch", "Bus fare", "Movie", "Groceries", "Shopping", "Doctor", "Gift", "Dining", "Refund", "Bonus"]
-    for i in range(n):
-        date_obj = today - timedelta(days=n-i-1)
-        date = date_obj.strftime("%Y-%m-%d")
-        # Monthly salary (income)
-        if date_obj.day == 1:
-            salary = random.uniform(20000, 21000)
-            save_transaction(username, date, "income", "Salary", salary, "Monthly Salary")
-        # Monthly rent
-        if date_obj.day == 2:
-            rent = random.uniform(2800, 3200)
-            save_transaction(username, date, "expense", "Rent", rent, "Monthly Rent")
-        # Monthly utilities
-        if date_obj.day == 5:
-            utilities = random.uniform(500, 600)
-            save_transaction(username, date, "expense", "Utilities", utilities, "Utilities Bill")
-        # Weekly groceries
-        if date_obj.weekday() == 0:
-            groceries = random.uniform(1100, 1200)
-            save_transaction(username, date, "expense", "Groceries", groceries, "Weekly Groceries")
-        # Daily expense (small variation, rare spike)
-        base_expense = random.uniform(500, 550)
-        if random.random() < 0.05:
-            base_expense += random.uniform(50, 200)  # rare, small spike
-        save_transaction(username, date, "expense", "Daily Expenses", base_expense, random.choice(descs))
-        # Occasional random expense (1-2 times/week)
-        if random.random() < 0.18:
-            save_transaction(username, date, "expense", random.choice(["Shopping", "Dining Out", "Healthcare"]), random.uniform(300, 700), random.choice(descs))
-        # Occasional small random income (1-2 times/month)
-        if random.random() < 0.05:
-            save_transaction(username, date, "income", random.choice(["Gift", "Refund", "Bonus"]), random.uniform(800, 1200), random.choice(descs))
+        # One budget per user/category, enforced by idx_budgets_user_category
+        c.execute('''INSERT INTO budgets (username, category, budget_amount, period) VALUES (?, ?, ?, ?)
+                     ON CONFLICT (username, category) DO UPDATE SET budget_amount = excluded.budget_amount, period = excluded.period''',
+                  (username, category, float(budget_amount), period))
+    bump_version(username, changed_from=None)
+    return True, "Budget saved."
+
+BUDGET_STATUS_COLUMNS = ['category', 'budget_amount', 'period', 'period_key', 'spent', 'remaining', 'exceeded']
+
+def _budget_status_sql(where):
+    # Spend per budget from the expense rollups: lifetime budgets sum the yearly rows, period budgets
+    # read the single row of the period containing :as_of (its rollup key is returned as period_key).
+    # Every lookup hits the rollups primary key.
+    current = ' '.join(f"WHEN '{g}' THEN {ROLLUP_PERIODS[g].format(d=':as_of')}" for g in ('year', 'month', 'week'))
+    return f'''SELECT b.category, b.budget_amount, b.period, CASE b.period WHEN 'all' THEN 'all' {current} END,
+                       COALESCE(SUM(r.total), 0)
+                FROM budgets b
+                LEFT JOIN rollups r ON r.username = b.username
+                    AND r.granularity = CASE b.period WHEN 'all' THEN 'year' ELSE b.period END
+                    AND r.type = 'expense' AND r.category = b.category
+                    AND r.period BETWEEN CASE b.period WHEN 'all' THEN '' {current} END
+                                     AND CASE b.period WHEN 'all' THEN '~' {current} END
+                WHERE {where}
+                GROUP BY b.id
+                ORDER BY b.category'''
+
+def _budget_status_row(row):
+    category, budget_amount, period, period_key, spent = row
+    return {'category': category, 'budget_amount': budget_amount, 'period': period, 'period_key': period_key, 'spent': spent,
+            'remaining': budget_amount - spent, 'exceeded': spent > budget_amount > 0}
+
+def budget_status(username, as_of=None):
+    # Spent vs budget for all of the user's budgets in one query; as_of (YYYY-MM-DD) picks the periods, default today
+    as_of = as_of or datetime.today().strftime(DATE_FORMAT)
+    return cached_frame(username, ('budget_status', as_of), lambda: _query_budget_status(username, as_of))
+
+def _query_budget_status(username, as_of):
+    with get_connection() as conn:
+        rows = conn.execute(_budget_status_sql('b.username = :username'), {'username': username, 'as_of': as_of}).fetchall()
+    return pd.DataFrame([_budget_status_row(row) for row in rows], columns=BUDGET_STATUS_COLUMNS)
+
+def category_budget_status(username, category, as_of=None):
+    # Status dict of one category's budget (reads only that category), or None without a budget
+    as_of = as_of or datetime.today().strftime(DATE_FORMAT)
+    with get_connection() as conn:
+        row = conn.execute(_budget_status_sql('b.username = :username AND b.category = :category'),
+                           {'username': username, 'category': category, 'as_of': as_of}).fetchone()
+    return _budget_status_row(row) if row else None
+
+def add_demo_transactions(username, n=90, seed=None):
+    # n days of demo history ending today; pass a seed for reproducible data
+    from datagen import generate_transactions, to_rows
+    save_transactions_bulk(username, to_rows(generate_transactions(n, seed)))
 
 def delete_all_transactions(username):
     with get_connection() as conn:
         c = conn.cursor()
         c.execute('DELETE FROM transactions WHERE username = ?', (username,))
-        return True 
\ No newline at end of file
+    bump_version(username)
+    return True 
\ No newline at end of file